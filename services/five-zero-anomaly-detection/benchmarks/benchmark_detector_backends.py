@@ -0,0 +1,145 @@
+"""
+Compares the inference backends and precisions of the YOLOv7 detector, on frames of the workcell test video.
+
+Usage:
+    uv run python benchmarks/benchmark_detector_backends.py --help
+"""
+
+import itertools
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+import tyro
+from numpy.typing import NDArray
+from rich import print
+from rich.table import Table
+
+from workspace_monitor.object_detector.onnx_yolo_v7 import OnnxYOLOv7
+from workspace_monitor.object_detector.yolo_v7 import YOLOv7
+from workspace_monitor.utils import Stopwatch
+from workspace_monitor.workers.workspace_monitor import (
+    DEFAULT_DETECTOR_RESOURCES_DIRECTORY,
+)
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Args:
+    video: Path = Path(__file__).parent / "../tests/resources/workcell_test_video.mp4"
+    """Video to take the frames from"""
+    resources: Path = DEFAULT_DETECTOR_RESOURCES_DIRECTORY
+    """Directory with the model weights and hyperparameters"""
+    device: str = "cpu"
+    """Device to run the model on"""
+    input_shape: tuple[int, int] = (384, 640)
+    """Fixed (height, width) of the model input"""
+    frames: int = 50
+    """Number of frames to run each backend on"""
+    backends: tuple[str, ...] = ("eager", "torchscript", "compile", "onnxruntime")
+    """Backends to compare, "onnxruntime" runs the exported `yolov7-mask.onnx` (its own input shape)"""
+    precisions: tuple[str, ...] = ("fp32",)
+    """Precisions to compare, e.g. fp32 bf16 on CPU, or fp32 fp16 on CUDA/MPS (ONNX Runtime runs in fp32 only)"""
+
+
+def read_frames(video: Path, count: int) -> list[NDArray]:
+    """
+    Reads the first frames of the video.
+    Falls back to random 1080p frames if the video is not available.
+    """
+    capture = cv2.VideoCapture(str(video))
+    frames = []
+    while capture.isOpened() and len(frames) < count:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+
+    if not frames:
+        log.warning(f"Could not read '{video}', using random frames")
+        rng = np.random.default_rng(0)
+        frames = [
+            rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8) for _ in range(count)
+        ]
+
+    return frames
+
+
+def model_memory(detector: YOLOv7) -> str:
+    """Memory of the weights of the detector's model, if it runs in PyTorch."""
+    model = getattr(detector, "model", None)
+    if model is None:
+        return "-"
+
+    tensors = itertools.chain(model.parameters(), model.buffers())
+    return f"{sum(t.numel() * t.element_size() for t in tensors) / 2**20:.1f} MiB"
+
+
+def main(args: Args) -> None:
+    frames = read_frames(args.video, args.frames)
+
+    (h, w) = args.input_shape
+    table = Table(
+        title=f"YOLOv7 inference on {len(frames)} frames, {h}x{w} input, {args.device}"
+    )
+    for column in (
+        "Backend",
+        "Precision",
+        "Startup",
+        "Time per frame",
+        "Model memory",
+        "Detections",
+    ):
+        table.add_column(column)
+
+    for backend, precision in itertools.product(args.backends, args.precisions):
+        if backend == "onnxruntime" and precision != "fp32":
+            continue
+
+        # includes tracing / compiling the model, or loading it from the cache
+        with Stopwatch() as startup_sw:
+            if backend == "onnxruntime":
+                onnx_file_path = args.resources / "yolov7-mask.onnx"
+                if not onnx_file_path.exists():
+                    log.warning(
+                        f"Skipping backend '{backend}': '{onnx_file_path}' not found"
+                    )
+                    continue
+                detector = OnnxYOLOv7(
+                    onnx_file_path=onnx_file_path,
+                    hyperparameters_file_path=args.resources / "hyp.scratch.mask.yaml",
+                )
+            else:
+                detector = YOLOv7(
+                    weights_file_path=args.resources / "yolov7-mask.pt",
+                    hyperparameters_file_path=args.resources / "hyp.scratch.mask.yaml",
+                    device=args.device,
+                    input_shape=args.input_shape,
+                    backend=backend,
+                    precision=precision,
+                )
+
+        detections = 0
+        with Stopwatch() as sw:
+            for frame in frames:
+                detections += len(detector.detect(frame))
+
+        table.add_row(
+            backend,
+            precision,
+            startup_sw.elapsed_time_pretty,
+            Stopwatch.prettify_time(sw.elapsed_time / len(frames)),
+            model_memory(detector),
+            str(detections),
+        )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(tyro.cli(Args))
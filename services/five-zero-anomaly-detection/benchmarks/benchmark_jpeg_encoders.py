@@ -0,0 +1,101 @@
+"""
+Compares the JPEG encoder backends used to publish frames, on 1080p frames of the workcell test video.
+
+Usage:
+    uv run python benchmarks/benchmark_jpeg_encoders.py --help
+"""
+
+import itertools
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+import tyro
+from numpy.typing import NDArray
+from rich import print
+from rich.table import Table
+
+from workspace_monitor.utils import JpegEncoder, Stopwatch
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Args:
+    video: Path = Path(__file__).parent / "../tests/resources/workcell_test_video.mp4"
+    """Video to take the frames from, frames are resized to 1080p"""
+    frames: int = 50
+    """Number of frames to encode with each encoder"""
+    backends: tuple[str, ...] = ("opencv", "pillow", "turbojpeg")
+    """Backends to compare"""
+    qualities: tuple[int, ...] = (75, 90)
+    """JPEG qualities to compare"""
+    scales: tuple[float, ...] = (1.0, 0.5)
+    """Frame scales to compare"""
+
+
+def read_frames(video: Path, count: int) -> list[NDArray]:
+    """
+    Reads the first frames of the video, resized to 1080p.
+    Falls back to random frames if the video is not available.
+    """
+    capture = cv2.VideoCapture(str(video))
+    frames = []
+    while capture.isOpened() and len(frames) < count:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, (1920, 1080)))
+    capture.release()
+
+    if not frames:
+        log.warning(
+            f"Could not read '{video}', using random frames (worst case for JPEG)"
+        )
+        rng = np.random.default_rng(0)
+        frames = [
+            rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8) for _ in range(count)
+        ]
+
+    return frames
+
+
+def main(args: Args) -> None:
+    frames = read_frames(args.video, args.frames)
+
+    table = Table(title=f"JPEG encoding of {len(frames)} 1080p frames")
+    for column in ("Backend", "Quality", "Scale", "Time per frame", "Size per frame"):
+        table.add_column(column)
+
+    for backend, quality, scale in itertools.product(
+        args.backends, args.qualities, args.scales
+    ):
+        try:
+            encoder = JpegEncoder(backend=backend, quality=quality, scale=scale)
+        except RuntimeError as e:
+            log.warning(f"Skipping backend '{backend}': {e}")
+            continue
+
+        encoder.encode(frames[0])  # warm up
+
+        size = 0
+        with Stopwatch() as sw:
+            for frame in frames:
+                size += len(encoder.encode(frame))
+
+        table.add_row(
+            backend,
+            str(quality),
+            str(scale),
+            Stopwatch.prettify_time(sw.elapsed_time / len(frames)),
+            f"{size / len(frames) / 1024:.0f} KiB",
+        )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(tyro.cli(Args))
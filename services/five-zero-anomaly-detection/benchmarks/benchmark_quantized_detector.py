@@ -0,0 +1,139 @@
+"""
+Compares the INT8 quantized detector to the original (fp32) one, on frames of the workcell test video:
+time per frame, and the detections of the tracked classes the quantized model misses (or adds),
+taking the original model's detections as the reference.
+
+Usage:
+    uv run python benchmarks/benchmark_quantized_detector.py --help
+"""
+
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import tyro
+from rich import print
+from rich.table import Table
+
+from workspace_monitor.object_detector.onnx_yolo_v7 import (
+    OnnxYOLOv7,
+    read_calibration_frames,
+)
+from workspace_monitor.object_detector.utils import BoundingBox
+from workspace_monitor.object_detector.yolo_v7 import Detection
+from workspace_monitor.utils import Stopwatch
+from workspace_monitor.workers.workspace_monitor import (
+    DEFAULT_DETECTOR_RESOURCES_DIRECTORY,
+)
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Args:
+    video: Path = Path(__file__).parent / "../tests/resources/workcell_test_video.mp4"
+    """Video to take the frames from"""
+    resources: Path = DEFAULT_DETECTOR_RESOURCES_DIRECTORY
+    """Directory with the exported models (yolov7-mask.onnx and yolov7-mask.int8.onnx) and hyperparameters"""
+    frames: int = 200
+    """Number of frames, spread over the video, to run the models on"""
+    tracked_objects: tuple[str, ...] = ("person",)
+    """Classes to compare the detections of"""
+    iou_threshold: float = 0.5
+    """Minimum IoU of the boxes for a detection of the quantized model to match one of the original model"""
+
+
+def box_iou(a: BoundingBox, b: BoundingBox) -> float:
+    """IoU of two (x, y, w, h) boxes."""
+    w = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    h = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    intersection = max(w, 0) * max(h, 0)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def count_matches(
+    reference: list[Detection], detections: list[Detection], iou_threshold: float
+) -> int:
+    """
+    Number of reference detections matched by a detection of the same class (greedily, by decreasing confidence).
+    """
+    unmatched = sorted(detections, key=lambda d: d.confidence, reverse=True)
+    matches = 0
+    for ref in sorted(reference, key=lambda d: d.confidence, reverse=True):
+        candidates = [d for d in unmatched if d.class_name == ref.class_name]
+        best = max(candidates, key=lambda d: box_iou(ref.box, d.box), default=None)
+        if best is not None and box_iou(ref.box, best.box) >= iou_threshold:
+            unmatched.remove(best)
+            matches += 1
+
+    return matches
+
+
+def main(args: Args) -> None:
+    frames = read_calibration_frames(args.video, args.frames)
+
+    hyperparameters_file_path = args.resources / "hyp.scratch.mask.yaml"
+    detectors = {
+        "fp32": OnnxYOLOv7(
+            args.resources / "yolov7-mask.onnx", hyperparameters_file_path
+        ),
+        "int8": OnnxYOLOv7(
+            args.resources / "yolov7-mask.int8.onnx", hyperparameters_file_path
+        ),
+    }
+
+    detections = {}
+    times = {}
+    for name, detector in detectors.items():
+        classes = detector.class_indices(list(args.tracked_objects))
+        detector.detect(frames[0], classes=classes)  # warm up
+
+        with Stopwatch() as sw:
+            detections[name] = [
+                detector.detect(frame, classes=classes) for frame in frames
+            ]
+        times[name] = sw.elapsed_time / len(frames)
+
+    reference_count = sum(len(d) for d in detections["fp32"])
+    quantized_count = sum(len(d) for d in detections["int8"])
+    matches = sum(
+        count_matches(reference, quantized, args.iou_threshold)
+        for reference, quantized in zip(detections["fp32"], detections["int8"])
+    )
+
+    table = Table(
+        title=f"INT8 vs fp32 detector on {len(frames)} frames, {', '.join(args.tracked_objects)}"
+    )
+    for column in (
+        "Model",
+        "Time per frame",
+        "Speed-up",
+        "Detections",
+        "Recall vs fp32",
+        "Precision vs fp32",
+    ):
+        table.add_column(column)
+    table.add_row(
+        "fp32",
+        Stopwatch.prettify_time(times["fp32"]),
+        "1.00x",
+        str(reference_count),
+        "-",
+        "-",
+    )
+    table.add_row(
+        "int8",
+        Stopwatch.prettify_time(times["int8"]),
+        f"{times['fp32'] / times['int8']:.2f}x",
+        str(quantized_count),
+        f"{matches / reference_count:.3f}" if reference_count else "-",
+        f"{matches / quantized_count:.3f}" if quantized_count else "-",
+    )
+
+    print(table)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(tyro.cli(Args))
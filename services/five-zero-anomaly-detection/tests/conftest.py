@@ -1,6 +1,11 @@
+from collections.abc import Callable
 from pathlib import Path
 
 import pytest
+import torch
+
+from workspace_monitor.object_detector.yolo_v7 import YOLOv7
+from workspace_monitor.options import InferenceBackend, Precision
 
 
 @pytest.fixture
@@ -10,3 +15,44 @@ def workcell_test_video() -> Path:
     """
 
     return Path(__file__).parent / "resources/workcell_test_video.mp4"
+
+
+@pytest.fixture
+def detector_hyperparameters_file_path() -> Path:
+    """
+    Hyperparameters of the YOLOv7-mask model.
+    """
+
+    return (
+        Path(__file__).parent
+        / "../workspace_monitor/object_detector/resources/hyp.scratch.mask.yaml"
+    )
+
+
+@pytest.fixture
+def make_detector(
+    tmp_path: Path, detector_hyperparameters_file_path: Path
+) -> Callable[..., YOLOv7]:
+    """
+    Factory of YOLOv7 detectors running a given model, e.g. a small stand-in for YOLOv7-mask, instead of loading
+    the weights. Without a model, the detector only supports preprocessing.
+    Files derived from the weights (e.g. traced models) are cached in the test's temporary directory.
+    """
+    weights_file_path = tmp_path / "weights.pt"
+    weights_file_path.write_bytes(b"weights")
+
+    def make(
+        model: torch.nn.Module | None = None,
+        input_shape: tuple[int, int] | None = None,
+        backend: InferenceBackend = "eager",
+        precision: Precision = "fp32",
+    ) -> YOLOv7:
+        detector = YOLOv7.__new__(YOLOv7)
+        detector._init_processing(
+            detector_hyperparameters_file_path, "cpu", input_shape, precision
+        )
+        if model is not None:
+            detector._init_model(model, weights_file_path, backend, fuse=True)
+        return detector
+
+    return make
@@ -0,0 +1,31 @@
+import pytest
+
+from workspace_monitor.utils import DropOldestQueue
+
+
+def test_drop_oldest_queue() -> None:
+    queue = DropOldestQueue(maxsize=2)
+
+    for i in range(5):
+        queue.put(i)
+
+    # only the freshest items are kept
+    assert queue.get_nowait() == 3
+    assert queue.get_nowait() == 4
+    assert queue.dropped == 3
+
+
+def test_drop_oldest_queue_put_without_dropping() -> None:
+    queue = DropOldestQueue(maxsize=2)
+
+    queue.put(1)
+    queue.put(2)
+    queue.put_without_dropping(None)
+
+    assert [queue.get_nowait() for _ in range(3)] == [1, 2, None]
+    assert queue.dropped == 0
+
+
+def test_drop_oldest_queue_must_be_bounded() -> None:
+    with pytest.raises(ValueError):
+        DropOldestQueue(maxsize=0)
@@ -0,0 +1,24 @@
+import cv2
+import numpy as np
+import pytest
+
+from workspace_monitor.utils import JpegEncoder
+
+
+@pytest.mark.parametrize("backend", ["opencv", "pillow"])
+def test_jpeg_encoder_roundtrip(backend):
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    frame[:, :, 2] = 255  # red in BGR
+
+    data = JpegEncoder(backend=backend, scale=0.5).encode(frame)
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    assert decoded.shape == (60, 80, 3)
+    assert np.allclose(decoded.mean(axis=(0, 1)), (0, 0, 255), atol=5)
+
+
+def test_jpeg_encoder_rejects_invalid_settings():
+    with pytest.raises(ValueError):
+        JpegEncoder(quality=0)
+    with pytest.raises(ValueError):
+        JpegEncoder(scale=1.5)
@@ -46,3 +46,168 @@ def test_livekit_video_stream() -> None:
     #     # display the frame
     #     cv2.imshow("LiveKit Video Stream", frame)
     #     cv2.waitKey(1)
+
+
+def make_offline_stream():
+    from workspace_monitor.video_stream.livekit_video_stream import (
+        LiveKitVideoStream,
+    )
+
+    return LiveKitVideoStream(
+        url="",
+        identity="test_livekit_video_stream",
+        room_name="",
+        track_name="",
+        api_key="",
+        api_secret="",
+    )
+
+
+def receive_frame(streamer, frame) -> None:
+    """Hands a LiveKit frame to the stream, as its handler thread does."""
+    from datetime import datetime
+
+    with streamer._frame_condition:
+        streamer._latest_frame = frame
+        streamer._latest_frame_time = datetime.now()
+        streamer._frame_count += 1
+        streamer._frame_condition.notify_all()
+
+
+def red_livekit_frame():
+    import numpy as np
+    from livekit import rtc
+
+    rgb = np.zeros((4, 6, 3), dtype=np.uint8)
+    rgb[..., 0] = 255
+    return rtc.VideoFrame(6, 4, rtc.VideoBufferType.RGB24, rgb.tobytes())
+
+
+def test_livekit_video_stream_converts_latest_frame() -> None:
+    """
+    Test that frames are converted to BGR only when taken, and not shared between consumers.
+    """
+    streamer = make_offline_stream()
+    receive_frame(streamer, red_livekit_frame())
+
+    frame = streamer.get_latest_frame()
+    assert frame.shape == (4, 6, 3)
+    assert (frame[..., 2] == 255).all() and (frame[..., :2] == 0).all()
+
+    frame[:] = 0
+    assert (streamer.get_latest_frame()[..., 2] == 255).all()
+
+
+def test_livekit_video_stream_waits_for_new_frame() -> None:
+    """
+    Test that frames are returned only once, by sequence number, and that the end of the stream wakes up waiters.
+    """
+    import threading
+
+    streamer = make_offline_stream()
+    receive_frame(streamer, red_livekit_frame())
+
+    frame = streamer.wait_for_new_frame(after_seq=0, timeout=1)
+    assert frame.seq == 1
+
+    with pytest.raises(TimeoutError):
+        streamer.wait_for_new_frame(after_seq=frame.seq, timeout=0.05)
+
+    threading.Timer(0.05, receive_frame, (streamer, red_livekit_frame())).start()
+    assert streamer.wait_for_new_frame(after_seq=frame.seq, timeout=1).seq == 2
+
+    threading.Timer(0.05, receive_frame, (streamer, None)).start()
+    assert streamer.wait_for_new_frame(after_seq=2, timeout=1) is None
+
+
+def test_wait_for_new_frames_skips_stalled_streams() -> None:
+    """
+    Test that a stalled stream does not hold back the others past the timeout, and that the end of any stream
+    ends the wait.
+    """
+    import time
+
+    from workspace_monitor.video_stream.livekit_video_stream import wait_for_new_frames
+
+    streamers = [make_offline_stream() for _ in range(3)]
+    for streamer in streamers:
+        receive_frame(streamer, red_livekit_frame())
+    receive_frame(streamers[2], red_livekit_frame())
+
+    # the first stream has no frame after the first one, the others do
+    start_time = time.monotonic()
+    frames = wait_for_new_frames(streamers, after_seqs=[1, 0, 1], timeout=0.1)
+    assert 0.1 <= time.monotonic() - start_time < 0.5
+    assert frames[0] is None
+    assert [frame.seq for frame in frames[1:]] == [1, 2]
+
+    # known stalled streams are not waited for...
+    start_time = time.monotonic()
+    frames = wait_for_new_frames(
+        streamers, after_seqs=[1, 1, 1], timeout=1, stalled={0, 1}
+    )
+    assert time.monotonic() - start_time < 0.5
+    assert frames[:2] == [None, None] and frames[2].seq == 2
+
+    # ...unless all of them are, then there is nothing else to do than waiting
+    start_time = time.monotonic()
+    frames = wait_for_new_frames(
+        streamers, after_seqs=[1, 1, 2], timeout=0.1, stalled={0, 1, 2}
+    )
+    assert 0.1 <= time.monotonic() - start_time < 0.5
+    assert frames == [None, None, None]
+
+    receive_frame(streamers[1], None)
+    assert wait_for_new_frames(streamers, after_seqs=[0, 0, 0], timeout=0.1) is None
+
+
+def test_frame_to_cv2_i420() -> None:
+    """
+    Test that I420 frames are converted to BGR directly, like LiveKit's own RGB conversion.
+    """
+    import numpy as np
+    from livekit import rtc
+
+    from workspace_monitor.video_stream.livekit_video_stream import frame_to_cv2
+
+    # a red frame in I420
+    (w, h) = (6, 4)
+    planes = [np.full(w * h, 81), np.full(w * h // 4, 90), np.full(w * h // 4, 240)]
+    frame = rtc.VideoFrame(
+        w,
+        h,
+        rtc.VideoBufferType.I420,
+        np.concatenate(planes).astype(np.uint8).tobytes(),
+    )
+
+    direct = frame_to_cv2(frame)
+    via_rgb24 = frame_to_cv2(frame.convert(rtc.VideoBufferType.RGB24))
+
+    assert direct.shape == (h, w, 3)
+    assert np.abs(direct.astype(int) - via_rgb24).max() <= 2
+    assert direct[0, 0, 2] > 250
+
+
+def test_frame_to_cv2_max_height() -> None:
+    """
+    Test that frames are downscaled on ingest, in I420 as well as in RGB24.
+    """
+    import cv2
+    import numpy as np
+    from livekit import rtc
+
+    from workspace_monitor.video_stream.livekit_video_stream import frame_to_cv2
+
+    (w, h) = (64, 48)
+    xx, yy = np.meshgrid(np.arange(w), np.arange(h))
+    bgr = np.stack([xx * 4, yy * 4, (xx + yy) * 2], axis=-1).astype(np.uint8)
+    i420 = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420)
+    frame = rtc.VideoFrame(w, h, rtc.VideoBufferType.I420, i420.tobytes())
+
+    direct = frame_to_cv2(frame, max_height=24)
+    via_rgb24 = frame_to_cv2(frame.convert(rtc.VideoBufferType.RGB24), max_height=24)
+    full = frame_to_cv2(frame, max_height=h)
+
+    assert direct.shape == via_rgb24.shape == (24, 32, 3)
+    assert np.abs(direct.astype(int) - via_rgb24).mean() < 4
+    assert full.shape == (h, w, 3)
@@ -0,0 +1,106 @@
+import time
+from datetime import datetime
+
+import numpy as np
+
+from workspace_monitor import main as main_module
+from workspace_monitor.config import (
+    Config,
+    LiveKitConfig,
+    MonitorConfig,
+    MqttConfig,
+    PipelineConfig,
+)
+from workspace_monitor.video_stream.livekit_video_stream import StreamFrame
+from workspace_monitor.workers.workspace_monitor import WorkspaceState
+
+
+class StallingStream:
+    """
+    Stand-in for `LiveKitVideoStream`: delivers a single frame, then stalls until the stream ends.
+    """
+
+    instances = []
+
+    def __init__(self, duration: float = 0.5, **kwargs):
+        self.end_time = time.monotonic() + duration
+        self.waits = 0
+        StallingStream.instances.append(self)
+
+    def start(self) -> None:
+        pass
+
+    def wait_for_new_frame(self, after_seq: int = 0, timeout: float | None = None):
+        self.waits += 1
+        if after_seq == 0:
+            image = np.zeros((48, 64, 3), dtype=np.uint8)
+            return StreamFrame(seq=1, timestamp=datetime.now(), image=image)
+
+        remaining = self.end_time - time.monotonic()
+        if timeout is not None and timeout < remaining:
+            time.sleep(timeout)
+            raise TimeoutError()
+
+        time.sleep(max(remaining, 0))
+        return None
+
+
+class RecordingPublisher:
+    def __init__(self, topic: str, **kwargs):
+        self.topic = topic
+        self.published = []
+
+    def connect(self) -> None:
+        pass
+
+    def publish_state(self, state, topic=None) -> None:
+        self.published.append(state)
+
+
+class EmptyWorkspaceMonitor:
+    def __init__(self, **kwargs):
+        pass
+
+    def process_batch(self, frames, timestamps=None, cameras=None):
+        return [
+            WorkspaceState(timestamp=timestamp, frame=frame, intrusions=[])
+            for frame, timestamp in zip(frames, timestamps)
+        ]
+
+
+def test_main_waits_for_stalled_cameras(monkeypatch) -> None:
+    publishers = []
+
+    def make_publisher(**kwargs) -> RecordingPublisher:
+        publishers.append(RecordingPublisher(**kwargs))
+        return publishers[-1]
+
+    monkeypatch.setattr(StallingStream, "instances", [])
+    monkeypatch.setattr(main_module, "LiveKitVideoStream", StallingStream)
+    monkeypatch.setattr(main_module, "WorkspaceStatePublisher", make_publisher)
+    monkeypatch.setattr(main_module, "WorkspaceMonitor", EmptyWorkspaceMonitor)
+
+    cfg = Config.model_construct(
+        livekit=LiveKitConfig(
+            identity="test",
+            room_name="room",
+            track_name="camera",
+            url="",
+            api_key="",
+            api_secret="",
+        ),
+        mqtt=MqttConfig(broker="localhost", port=1883, topic="workspace"),
+        monitor=MonitorConfig(tracked_objects=["person"]),
+        pipeline=PipelineConfig(frame_timeout=0.1),
+    )
+
+    start_time = time.process_time()
+    main_module.main(cfg)
+
+    # the only camera stalls after its first frame: the loop waits for it rather than spinning,
+    # and publishes its last state as a heartbeat about once per frame timeout
+    (stream,) = StallingStream.instances
+    assert stream.waits < 20
+    assert time.process_time() - start_time < 0.3
+    assert 2 <= len(publishers[0].published) < 20
+    assert all(state.reused for state in publishers[0].published[1:])
@@ -0,0 +1,90 @@
+import torch
+from torchvision.ops import roi_align
+
+from workspace_monitor.object_detector.models.utils.general import (
+    non_max_suppression_mask_conf,
+    non_max_suppression_mask_conf_batched,
+)
+
+HYP = {"attn_resolution": 14, "num_base": 5, "mask_resolution": 56}
+
+
+def pooler(features: torch.Tensor, boxes) -> torch.Tensor:
+    return roi_align(
+        features, boxes, output_size=56, spatial_scale=0.25, sampling_ratio=-1
+    )
+
+
+def random_model_output(batch_size: int, height: int = 256, width: int = 320):
+    """
+    Random output of the YOLOv7-mask model with boxes inside the image.
+    """
+    generator = torch.Generator().manual_seed(0)
+    n = 100
+
+    prediction = torch.rand(batch_size, n, 85, generator=generator)
+    prediction[..., 0] = prediction[..., 0] * width / 2 + width / 4
+    prediction[..., 1] = prediction[..., 1] * height / 2 + height / 4
+    prediction[..., 2] = prediction[..., 2] * width / 4 + 8
+    prediction[..., 3] = prediction[..., 3] * height / 4 + 8
+    attn = torch.randn(batch_size, n, 5 * 14 * 14, generator=generator)
+    bases = torch.randn(batch_size, 5, height // 4, width // 4, generator=generator)
+
+    return prediction, attn, bases
+
+
+def test_batched_nms_matches_per_image_nms() -> None:
+    prediction, attn, bases = random_model_output(batch_size=3)
+
+    expected, expected_masks, *_ = non_max_suppression_mask_conf(
+        prediction.clone(), attn, bases, pooler, HYP, conf_thres=0.25, iou_thres=0.65
+    )
+    actual, actual_masks, _ = non_max_suppression_mask_conf_batched(
+        prediction.clone(), attn, bases, pooler, HYP, conf_thres=0.25, iou_thres=0.65
+    )
+
+    for e, e_masks, a, a_masks in zip(expected, expected_masks, actual, actual_masks):
+        # same detections, possibly in a different order
+        e_order, a_order = e[:, 4].argsort(), a[:, 4].argsort()
+        assert torch.allclose(e[e_order], a[a_order], atol=1e-5)
+        assert torch.allclose(e_masks[e_order], a_masks[a_order], atol=1e-5)
+
+
+def test_batched_nms_without_candidates() -> None:
+    prediction, attn, bases = random_model_output(batch_size=2)
+    prediction[..., 4] = 0
+
+    output, output_masks, output_scores = non_max_suppression_mask_conf_batched(
+        prediction, attn, bases, pooler, HYP
+    )
+
+    assert output == [None, None]
+    assert output_masks == [None, None]
+    assert output_scores == [None, None]
+
+
+def test_batched_nms_class_filter() -> None:
+    prediction, attn, bases = random_model_output(batch_size=2)
+    prediction[..., 5:] **= (
+        16  # fewer confident classes, to stay below the detection limit
+    )
+
+    all_classes, *_ = non_max_suppression_mask_conf_batched(
+        prediction.clone(), attn, bases, pooler, HYP, conf_thres=0.25, iou_thres=0.65
+    )
+    person_only, person_masks, _ = non_max_suppression_mask_conf_batched(
+        prediction.clone(),
+        attn,
+        bases,
+        pooler,
+        HYP,
+        conf_thres=0.25,
+        iou_thres=0.65,
+        classes=[0],
+    )
+
+    for a, p, p_masks in zip(all_classes, person_only, person_masks):
+        # the early exit must not change the detections of the requested classes
+        a = a[a[:, 5] == 0]
+        assert torch.allclose(a[a[:, 4].argsort()], p[p[:, 4].argsort()], atol=1e-5)
+        assert p_masks.shape[0] == p.shape[0]
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+from pydantic import ValidationError
+
+from workspace_monitor.config import PipelineConfig
+from workspace_monitor.workers.rate_controller import InferenceRateController
+
+
+def run(
+    controller: InferenceRateController, iterations: int, intrusions: bool = False
+) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        controller.wait()
+        controller.update(intrusions)
+    return time.perf_counter() - start
+
+
+def test_rate_controller_paces_idle_loop() -> None:
+    controller = InferenceRateController(idle_fps=50, active_fps=None, hold_off=60)
+
+    # 10 iterations at 50 FPS take 9 intervals of 20 ms
+    assert run(controller, 10) >= 9 * 0.02
+    assert not controller.active
+    assert controller.target_fps == 50
+    assert controller.effective_fps == pytest.approx(50, rel=0.2)
+
+
+def test_rate_controller_runs_at_active_rate_after_intrusion() -> None:
+    controller = InferenceRateController(idle_fps=1, active_fps=None, hold_off=60)
+
+    controller.wait()
+    controller.update(intrusions=True)
+    assert controller.active and controller.target_fps is None
+
+    # unlimited during the hold-off period, even without intrusions in the meantime
+    assert run(controller, 10) < 0.5
+
+
+def test_rate_controller_returns_to_idle_rate_after_hold_off() -> None:
+    controller = InferenceRateController(idle_fps=1, active_fps=100, hold_off=0.05)
+
+    controller.wait()
+    controller.update(intrusions=True)
+    assert controller.target_fps == 100
+
+    time.sleep(0.06)
+    assert not controller.active and controller.target_fps == 1
+
+
+def test_rate_controller_checks_bounds() -> None:
+    with pytest.raises(ValueError):
+        InferenceRateController(idle_fps=0)
+    with pytest.raises(ValueError):
+        InferenceRateController(idle_fps=5, active_fps=1)
+
+
+def test_pipeline_config_rejects_active_rate_without_idle_rate() -> None:
+    PipelineConfig(idle_fps=2, active_fps=15, active_hold_off=5)
+    PipelineConfig()
+
+    with pytest.raises(ValidationError, match="Set idle_fps to use active_fps"):
+        PipelineConfig(active_fps=15)
+    with pytest.raises(ValidationError, match="Set idle_fps to use active_hold_off"):
+        PipelineConfig(active_hold_off=5)
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import numpy as np
+
+from workspace_monitor.workers.scene_change_filter import SceneChangeFilter
+from workspace_monitor.workers.workspace_monitor import WorkspaceMonitor
+
+
+def test_scene_change_filter_skips_static_frames() -> None:
+    scene_filter = SceneChangeFilter(threshold=0.01, max_interval=60)
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (360, 640, 3), dtype=np.uint8)
+    noisy = np.clip(
+        frame.astype(int) + rng.integers(-5, 6, frame.shape), 0, 255
+    ).astype(np.uint8)
+    changed = frame.copy()
+    changed[100:250, 200:400] = 255  # someone walks in
+
+    assert scene_filter.needs_inference(0, frame)
+    assert not scene_filter.needs_inference(0, frame)
+    assert not scene_filter.needs_inference(0, noisy)
+    assert scene_filter.needs_inference(0, changed)
+    assert not scene_filter.needs_inference(0, changed)
+
+    # cameras are compared to their own references
+    assert scene_filter.needs_inference(1, frame)
+
+
+def test_scene_change_filter_max_interval() -> None:
+    scene_filter = SceneChangeFilter(max_interval=0)
+    frame = np.zeros((360, 640, 3), dtype=np.uint8)
+
+    assert scene_filter.needs_inference(0, frame)
+    assert scene_filter.needs_inference(0, frame)
+
+
+class RecordingDetector:
+    def __init__(self):
+        self.batches = []
+        self.detections = []
+
+    def class_indices(self, class_names):
+        return list(range(len(class_names)))
+
+    def detect_batch(self, images, classes=None):
+        self.batches.append(len(images))
+        return [list(self.detections) for _ in images]
+
+
+def test_workspace_monitor_reuses_state_of_static_scene() -> None:
+    monitor = WorkspaceMonitor(
+        ["person"],
+        detector=RecordingDetector(),
+        scene_change_filter=SceneChangeFilter(max_interval=60),
+    )
+
+    static = np.zeros((360, 640, 3), dtype=np.uint8)
+    moving = np.full((360, 640, 3), 255, dtype=np.uint8)
+
+    monitor.process_batch([static, static])
+    monitor.process_batch([static, static])
+    states = monitor.process_batch(
+        [static, moving], timestamps=[datetime(2025, 1, 1)] * 2
+    )
+
+    # the first frames of each camera, and then the frame that changed
+    assert sum(monitor.detector.batches) == 2 + 2 + 1
+    assert [s.reused for s in states] == [True, False]
+    assert states[0].frame is static and states[0].timestamp == datetime(2025, 1, 1)
+
+    # while there are intrusions, every frame goes through the detector
+    monitor.detector.detections = ["person"]
+    monitor.process_batch([moving, static])
+    monitor.detector.batches.clear()
+    states = monitor.process_batch([moving, static])
+    assert monitor.detector.batches == [2]
+    assert [s.intrusions for s in states] == [["person"], ["person"]]
+
+
+def test_workspace_monitor_keys_states_by_camera() -> None:
+    monitor = WorkspaceMonitor(
+        ["person"],
+        detector=RecordingDetector(),
+        scene_change_filter=SceneChangeFilter(max_interval=60),
+    )
+
+    static = np.zeros((360, 640, 3), dtype=np.uint8)
+    moving = np.full((360, 640, 3), 255, dtype=np.uint8)
+
+    monitor.process_batch([static, moving], cameras=["left", "right"])
+    monitor.process_batch([static, moving], cameras=["left", "right"])
+    # the left camera has no new frame, the right one's is compared to its own reference
+    states = monitor.process_batch([moving], cameras=["right"])
+    assert [s.reused for s in states] == [True]
+    assert sum(monitor.detector.batches) == 2 + 2
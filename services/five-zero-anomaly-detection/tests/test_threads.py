@@ -0,0 +1,45 @@
+import threading
+
+import cv2
+import pytest
+
+from workspace_monitor.utils import (
+    configure_threads,
+    current_thread_cpus,
+    pin_current_thread,
+)
+
+
+def test_configure_threads_sets_opencv_threads() -> None:
+    previous = cv2.getNumThreads()
+    try:
+        configure_threads(opencv_threads=1)
+        assert cv2.getNumThreads() == 1
+    finally:
+        cv2.setNumThreads(previous)
+
+
+def test_pin_current_thread_is_inherited_by_new_threads_only() -> None:
+    cpus = current_thread_cpus()
+    if not cpus:
+        pytest.skip("CPU affinity is not supported on this platform")
+
+    seen = {}
+
+    def pinned():
+        pin_current_thread(cpus[:1])
+
+        # threads started by the pinned thread inherit its affinity
+        child = threading.Thread(
+            target=lambda: seen.update(child=current_thread_cpus())
+        )
+        child.start()
+        child.join()
+        seen["pinned"] = current_thread_cpus()
+
+    thread = threading.Thread(target=pinned)
+    thread.start()
+    thread.join()
+
+    assert seen == {"pinned": cpus[:1], "child": cpus[:1]}
+    assert current_thread_cpus() == cpus
@@ -0,0 +1,119 @@
+import datetime
+import json
+from types import SimpleNamespace
+
+import numpy as np
+
+from workspace_monitor.utils import JpegEncoder
+from workspace_monitor.workers.publishing_worker import PublishingWorker
+from workspace_monitor.workers.workspace_monitor import WorkspaceState
+from workspace_monitor.workers.workspace_state_publisher import (
+    decode_payload,
+    encode_binary_payload,
+    encode_frame_base64_jpeg,
+    WorkspaceStatePublisher,
+)
+
+
+def test_decode_payload_formats():
+    frame = np.full((48, 64, 3), 128, dtype=np.uint8)
+    jpeg = JpegEncoder().encode(frame)
+    message = {"resolution": [64, 48], "intrusions": []}
+
+    # binary payload: metadata and raw JPEG data
+    payload = encode_binary_payload(
+        {"value": {**message, "frame": {"mime": "image/jpeg"}}}, jpeg
+    )
+    data, frame_data = decode_payload(payload)
+    assert data["resolution"] == [64, 48]
+    assert frame_data == jpeg
+
+    # JSON payload: base64 encoded JPEG data
+    payload = json.dumps(
+        {"value": {**message, "frame": encode_frame_base64_jpeg(frame)}}
+    ).encode()
+    data, frame_data = decode_payload(payload)
+    assert data["resolution"] == [64, 48]
+    assert frame_data == jpeg
+
+    assert len(encode_binary_payload({"value": message}, jpeg)) < len(payload)
+
+
+class RecordingMqttClient:
+    def __init__(self):
+        self.published = []
+        self.subscribed = []
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.published.append((topic, payload))
+
+    def subscribe(self, topic, qos=0):
+        self.subscribed.append(topic)
+
+
+def test_frames_published_separately():
+    publisher = WorkspaceStatePublisher(
+        "localhost", topic="workspace", payload_format="binary", frame_interval=60
+    )
+    publisher.client = RecordingMqttClient()
+
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    state = WorkspaceState(
+        timestamp=datetime.datetime.now(), frame=frame, intrusions=[]
+    )
+
+    # the first frame is always published, then frames are throttled
+    publisher.publish_state(state)
+    publisher.publish_state(state)
+    topics = [topic for (topic, _) in publisher.client.published]
+    assert topics == ["workspace", "workspace/frame", "workspace"]
+
+    data, frame_data = decode_payload(publisher.client.published[0][1])
+    assert data["frame"] is None and frame_data is None
+    data, frame_data = decode_payload(publisher.client.published[1][1])
+    assert data["resolution"] == [64, 48] and frame_data is not None
+
+    # frames requested by a consumer are published right away
+    publisher._on_message(None, None, SimpleNamespace(topic="workspace/frame/request"))
+    publisher.publish_state(state)
+    assert publisher.client.published[-1][0] == "workspace/frame"
+
+
+def test_frame_requests_subscribed_on_every_connection():
+    publisher = WorkspaceStatePublisher(
+        "localhost", topic="workspace", frame_interval=60
+    )
+    client = RecordingMqttClient()
+
+    # the initial connection, and a reconnection
+    publisher._on_connect(client, None, {}, 0)
+    publisher._on_connect(client, None, {}, 0)
+
+    expected = [("workspace/frame/request", 1), ("workspace/+/frame/request", 1)]
+    assert client.subscribed == [expected, expected]
+
+    # frames published with the states, nothing to request
+    publisher = WorkspaceStatePublisher("localhost", topic="workspace")
+    client = RecordingMqttClient()
+    publisher._on_connect(client, None, {}, 0)
+    assert client.subscribed == []
+
+
+def test_publishing_worker_publishes_remaining_states_on_stop():
+    publisher = WorkspaceStatePublisher("localhost", topic="workspace")
+    publisher.client = RecordingMqttClient()
+    worker = PublishingWorker(publisher, queue_size=2)
+
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for _ in range(2):
+        worker.submit(
+            WorkspaceState(
+                timestamp=datetime.datetime.now(), frame=frame, intrusions=[]
+            )
+        )
+
+    # the queue is full, stopping must not drop any of the states
+    worker.start()
+    worker.stop()
+    assert len(publisher.client.published) == 2
+    assert worker.dropped == 0
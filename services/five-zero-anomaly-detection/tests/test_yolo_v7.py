@@ -0,0 +1,512 @@
+import copy
+import sys
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from workspace_monitor.object_detector.models.utils.letterbox import (
+    LetterboxTransform,
+    letterbox,
+)
+from workspace_monitor.object_detector import yolo_v7
+from workspace_monitor.object_detector.yolo_v7 import (
+    Detection,
+    YOLOv7,
+    _cached_artifact,
+)
+from workspace_monitor.utils import configure_threads
+
+
+def test_preprocess_matches_letterbox(make_detector) -> None:
+    # a detector without a model, preprocessing does not need one
+    detector = make_detector()
+
+    rng = np.random.default_rng(0)
+    images = [
+        rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8),
+        rng.integers(0, 256, (480, 500, 3), dtype=np.uint8),
+    ]
+
+    # twice, to exercise the reused buffers
+    for _ in range(2):
+        image_tensor, letterboxes = detector._preprocess(images)
+
+        for i, image in enumerate(images):
+            image_letterboxed, _, padding = letterbox(image, 640, stride=64, auto=True)
+            h, w = image_letterboxed.shape[:2]
+            expected = torch.from_numpy(
+                image_letterboxed[..., ::-1].transpose(2, 0, 1) / 255
+            ).float()
+
+            assert letterboxes[i].shape == (h, w)
+            assert torch.allclose(image_tensor[i, :, :h, :w], expected)
+            assert (
+                not image_tensor[i, :, h:, :].any()
+                and not image_tensor[i, :, :, w:].any()
+            )
+
+
+def test_preprocess_fixed_input_shape(make_detector) -> None:
+    detector = make_detector(input_shape=(640, 640))
+
+    images = [
+        np.zeros((1080, 1920, 3), dtype=np.uint8),
+        np.zeros((480, 500, 3), dtype=np.uint8),
+    ]
+    image_tensor, letterboxes = detector._preprocess(images)
+
+    assert image_tensor.shape == (2, 3, 640, 640)
+    assert [lb.shape for lb in letterboxes] == [(640, 640), (640, 640)]
+    assert letterboxes[0].offset == (140, 0)
+
+
+def test_letterbox_transform() -> None:
+    for shape in [(1080, 1920), (720, 1280), (480, 500), (1000, 333), (640, 640)]:
+        image = np.zeros((*shape, 3), dtype=np.uint8)
+        image_letterboxed, ratio, padding = letterbox(image, 640, stride=64, auto=True)
+        transform = LetterboxTransform.for_shape(shape, 640, stride=64, auto=True)
+
+        assert transform.shape == image_letterboxed.shape[:2]
+        assert transform.padding == padding
+        assert np.allclose(transform.scale, ratio, atol=1e-2)
+
+        # computed once per shape
+        assert (
+            LetterboxTransform.for_shape(shape, 640, stride=64, auto=True) is transform
+        )
+
+        # the image corners map to the corners of the resized image inside the letterbox
+        box = np.array([0.0, 0.0, shape[1], shape[0]])
+        top, left = transform.offset
+        height, width = transform.resized_shape
+        assert np.allclose(
+            transform.image_to_letterbox(box), [left, top, left + width, top + height]
+        )
+        assert np.allclose(
+            transform.letterbox_to_image(box), [0, 0, shape[1], shape[0]]
+        )
+
+
+def test_paste_masks_in_image() -> None:
+    masks = torch.ones(2, 56, 56)
+    boxes = torch.tensor(
+        [
+            [10.0, 20.0, 50.0, 40.0],
+            [-15.0, 100.0, 30.0, 140.0],  # <- partially outside the image
+        ]
+    )
+
+    pasted, crop_boxes = YOLOv7._paste_masks_in_image(masks, boxes, (120, 160))
+
+    assert crop_boxes.tolist() == [[10, 20, 50, 40], [0, 100, 30, 120]]
+    assert pasted.shape == (2, 20, 40)
+
+    # a full mask covers exactly its (clipped) box
+    assert pasted[0].all()
+    assert pasted[1, :20, :30].all()
+    assert not pasted[1, :, 30:].any()
+
+
+def test_detection_mask_is_built_from_crop() -> None:
+    detection = Detection(
+        class_name="person",
+        confidence=0.9,
+        box=(15.0, 30.0, 60.0, 30.0),
+        mask_crop=np.ones((10, 20), dtype=bool),
+        mask_crop_box=(5, 10, 25, 20),
+        letterbox=LetterboxTransform.for_shape((108, 192), 64, auto=False),
+    )
+
+    mask = detection.mask
+
+    # the crop is scaled to the original image resolution
+    assert mask.shape == (108, 192)
+    assert mask[30:60, 15:75].all()
+    assert mask.sum() == 30 * 60
+    assert detection.mask_box == (15.0, 30.0, 60.0, 30.0)
+
+
+def test_mt_precomputed_grids_are_reused() -> None:
+    from workspace_monitor.object_detector.models.yolo import MT
+
+    anchors = (
+        (12, 16, 19, 36, 40, 28),
+        (36, 75, 76, 55, 72, 146),
+        (142, 110, 192, 243, 459, 401),
+    )
+    head = MT(nc=2, anchors=anchors, attn=4, ch=([8, 8, 8],)).eval()
+    head.stride = torch.tensor([8.0, 16.0, 32.0])
+
+    head.precompute_grids((64, 128))
+    grids = list(head.grid)
+    assert [tuple(g.shape) for g in grids] == [
+        (1, 1, 8, 16, 2),
+        (1, 1, 4, 8, 2),
+        (1, 1, 2, 4, 2),
+    ]
+
+    features = [torch.zeros(1, 8, 64 // s, 128 // s) for s in (8, 16, 32)]
+    with torch.no_grad():
+        output = head([features, None, None])
+
+    assert output["test"].shape == (1, 3 * (8 * 16 + 4 * 8 + 2 * 4), 7)
+    assert all(g is h for g, h in zip(grids, head.grid))
+
+
+def test_load_model_fuses_and_caches(tmp_path) -> None:
+    from workspace_monitor.object_detector.models.yolo import Model
+
+    # a small model with the layer types fused for inference: Conv (+BN) and RepConv
+    model = Model(
+        {
+            "nc": 2,
+            "depth_multiple": 1.0,
+            "width_multiple": 1.0,
+            "anchors": [[10, 13, 16, 30, 33, 23], [30, 61, 62, 45, 59, 119]],
+            "backbone": [
+                [-1, 1, "Conv", [16, 3, 2]],
+                [-1, 1, "Conv", [32, 3, 2]],
+                [-1, 1, "RepConv", [32, 3, 1]],
+                [-1, 1, "Conv", [32, 3, 2]],
+                [-1, 1, "RepConv", [32, 3, 1]],
+            ],
+            "head": [[[2, 4], 1, "Detect", ["nc", "anchors"]]],
+        }
+    ).eval()
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+
+    weights_file_path = tmp_path / "weights.pt"
+    torch.save({"model": model}, weights_file_path)
+
+    x = torch.rand(1, 3, 64, 64)
+    with torch.no_grad():
+        expected = model(x)[0]
+
+    # fused on the first load, loaded from the cache on the next one
+    for _ in range(2):
+        fused = YOLOv7._load_model(weights_file_path, fuse=True).eval()
+        assert not any(isinstance(m, torch.nn.BatchNorm2d) for m in fused.modules())
+        with torch.no_grad():
+            assert torch.allclose(fused(x)[0], expected, atol=1e-3)
+
+    assert len(list(tmp_path.glob("weights.fused-*.pt"))) == 1
+
+
+def test_cached_artifact_replaces_a_truncated_cache_file(tmp_path) -> None:
+    cache_file_path = tmp_path / "weights.fused-0123.pt"
+    builds = []
+
+    def cached():
+        return _cached_artifact(
+            cache_file_path,
+            build=lambda: builds.append(1) or {"weights": torch.arange(1000)},
+            save=torch.save,
+            load=torch.load,
+            description="test artifact",
+        )
+
+    cached()
+    # e.g. a crash while the cache file was written by an older version
+    cache_file_path.write_bytes(cache_file_path.read_bytes()[:100])
+
+    for _ in range(2):
+        assert torch.equal(cached()["weights"], torch.arange(1000))
+    assert len(builds) == 2
+    assert list(tmp_path.iterdir()) == [cache_file_path]
+
+
+def test_load_model_keeps_opencv_threads(tmp_path, monkeypatch) -> None:
+    # upstream checkpoints pickle the model under the top-level `models` package
+    monkeypatch.syspath_prepend(str(Path(yolo_v7.__file__).parent))
+    from models.yolo import Model
+
+    model = Model(
+        {
+            "nc": 2,
+            "depth_multiple": 1.0,
+            "width_multiple": 1.0,
+            "anchors": [[10, 13, 16, 30, 33, 23]],
+            "backbone": [[-1, 1, "Conv", [16, 3, 2]]],
+            "head": [[[0], 1, "Detect", ["nc", "anchors"]]],
+        }
+    )
+    weights_file_path = tmp_path / "weights.pt"
+    torch.save({"model": model}, weights_file_path)
+    assert type(model).__module__ == "models.yolo"
+
+    # unpickling imports the `models` modules again, as on a fresh start
+    for name in list(sys.modules):
+        if name == "models" or name.startswith("models."):
+            monkeypatch.delitem(sys.modules, name)
+
+    previous = cv2.getNumThreads()
+    try:
+        configure_threads(opencv_threads=3)
+        YOLOv7._load_model(weights_file_path, fuse=False)
+        assert "models.yolo" in sys.modules
+        assert cv2.getNumThreads() == 3
+    finally:
+        cv2.setNumThreads(previous)
+
+
+class _TinyMaskModel(torch.nn.Module):
+    """
+    Stand-in for the YOLOv7-mask model: strided convolutions feeding an MT head, plus bases and semantic outputs.
+    """
+
+    def __init__(self):
+        from workspace_monitor.object_detector.models.yolo import MT
+
+        super().__init__()
+        anchors = (
+            (12, 16, 19, 36, 40, 28),
+            (36, 75, 76, 55, 72, 146),
+            (142, 110, 192, 243, 459, 401),
+        )
+        head = MT(nc=2, anchors=anchors, attn=4, ch=([8, 8, 8],))
+        head.stride = torch.tensor([8.0, 16.0, 32.0])
+        self.model = torch.nn.ModuleList(
+            [
+                torch.nn.Conv2d(3, 8, 3, stride=8, padding=1),
+                torch.nn.Conv2d(8, 8, 3, stride=2, padding=1),
+                torch.nn.Conv2d(8, 8, 3, stride=2, padding=1),
+                head,
+            ]
+        )
+        self.bases = torch.nn.Conv2d(8, 5, 1)
+        self.sem = torch.nn.Conv2d(8, 1, 1)
+        self.names = ["person", "robot"]
+        self.pooler_scale = 1 / 8
+
+    def forward(self, x):
+        features = []
+        for conv in self.model[:-1]:
+            x = conv(x)
+            features.append(x)
+        return self.model[-1](
+            [features, self.bases(features[0]), self.sem(features[0])]
+        )
+
+
+def test_torchscript_backend_matches_eager(tmp_path, make_detector) -> None:
+    model = _TinyMaskModel()
+    detector = make_detector(copy.deepcopy(model), input_shape=(64, 128))
+
+    # a batch size other than the one of the trace
+    x = torch.rand(3, 3, 64, 128)
+    with torch.no_grad():
+        expected = detector._forward(x)
+
+    # traced on the first build, loaded from the cache on the next one
+    for _ in range(2):
+        detector = make_detector(
+            copy.deepcopy(model), input_shape=(64, 128), backend="torchscript"
+        )
+        with torch.no_grad():
+            outputs = detector._forward(x)
+        assert all(torch.allclose(o, e, atol=1e-5) for o, e in zip(outputs, expected))
+
+    assert (
+        len(list(tmp_path.glob("weights.fused-*.torchscript-64x128-cpu-fp32.pt"))) == 1
+    )
+
+
+def test_compile_backend_runs_any_batch_size_without_recompiling(make_detector) -> None:
+    model = _TinyMaskModel()
+    eager = make_detector(copy.deepcopy(model), input_shape=(64, 128))
+    compiled = make_detector(
+        copy.deepcopy(model), input_shape=(64, 128), backend="compile"
+    )
+
+    # batch sizes other than the ones of the warm-up
+    with torch.no_grad(), torch.compiler.set_stance("fail_on_recompile"):
+        for batch_size in (3, 1, 5):
+            x = torch.rand(batch_size, 3, 64, 128)
+            outputs = compiled._forward(x)
+            assert all(
+                torch.allclose(o, e, atol=1e-4)
+                for o, e in zip(outputs, eager._forward(x))
+            )
+
+
+def test_onnx_export_matches_eager(
+    tmp_path, make_detector, detector_hyperparameters_file_path
+) -> None:
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from workspace_monitor.object_detector.onnx_yolo_v7 import OnnxYOLOv7, export_onnx
+
+    detector = make_detector(_TinyMaskModel(), input_shape=(64, 128))
+
+    onnx_file_path = tmp_path / "model.onnx"
+    export_onnx(detector, onnx_file_path)
+
+    onnx_detector = OnnxYOLOv7(onnx_file_path, detector_hyperparameters_file_path)
+    assert onnx_detector.input_shape == (64, 128)
+    assert onnx_detector.names == ["person", "robot"]
+    assert onnx_detector.pooler_scale == detector.pooler_scale
+
+    x = torch.rand(2, 3, 64, 128)
+    with torch.no_grad():
+        expected = detector._forward(x)
+    outputs = onnx_detector._forward(x)
+    assert all(torch.allclose(o, e, atol=1e-4) for o, e in zip(outputs, expected))
+
+
+def test_quantized_onnx_model_is_close_to_original(
+    tmp_path, make_detector, detector_hyperparameters_file_path
+) -> None:
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from workspace_monitor.object_detector.onnx_yolo_v7 import (
+        OnnxYOLOv7,
+        export_onnx,
+        quantize_onnx,
+    )
+
+    detector = make_detector(_TinyMaskModel(), input_shape=(64, 128))
+
+    onnx_file_path = tmp_path / "model.onnx"
+    quantized_file_path = tmp_path / "model.int8.onnx"
+    export_onnx(detector, onnx_file_path)
+
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (108, 192, 3), dtype=np.uint8) for _ in range(8)]
+    quantize_onnx(onnx_file_path, quantized_file_path, images)
+
+    op_types = {node.op_type for node in onnx.load(str(quantized_file_path)).graph.node}
+    assert {"QuantizeLinear", "DequantizeLinear"} <= op_types
+
+    original = OnnxYOLOv7(onnx_file_path, detector_hyperparameters_file_path)
+    quantized = OnnxYOLOv7(quantized_file_path, detector_hyperparameters_file_path)
+    assert quantized.names == ["person", "robot"]
+
+    x, _ = original._preprocess(images[:2])
+    for o, q in zip(original._forward(x), quantized._forward(x)):
+        assert torch.allclose(o, q, rtol=0.05, atol=0.05 * o.abs().max().item())
+
+
+def test_bf16_precision_is_close_to_fp32(make_detector) -> None:
+    model = _TinyMaskModel()
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 256, (108, 192, 3), dtype=np.uint8) for _ in range(2)]
+
+    outputs = {}
+    for precision, dtype in [("fp32", torch.float32), ("bf16", torch.bfloat16)]:
+        detector = make_detector(
+            copy.deepcopy(model), input_shape=(64, 128), precision=precision
+        )
+
+        image_tensor, _ = detector._preprocess(images)
+        assert image_tensor.dtype == dtype
+
+        with torch.no_grad():
+            outputs[precision] = [o.float() for o in detector._forward(image_tensor)]
+
+    for o, e in zip(outputs["bf16"], outputs["fp32"]):
+        assert torch.allclose(o, e, rtol=0.05, atol=0.05 * e.abs().max().item())
+
+
+class _SquareDetectorModel(torch.nn.Module):
+    """
+    Hand-set stand-in for the YOLOv7-mask model, with an MT head and the mask sizes of the model's hyperparameters.
+    Detects the red 32x32 cells of the input at stride 32 (first anchor only, sized to the cell), as a "person" if
+    they are also green (white) and as a "robot" otherwise. The masks fill the whole boxes.
+    """
+
+    def __init__(self, attn_resolution: int = 14, num_base: int = 5):
+        from workspace_monitor.object_detector.models.yolo import MT
+
+        super().__init__()
+        anchors = ((8, 8) * 3, (16, 16) * 3, (32, 32) * 3)
+        head = MT(
+            nc=2, anchors=anchors, attn=num_base * attn_resolution**2, ch=([3, 3, 3],)
+        )
+        head.stride = torch.tensor([8.0, 16.0, 32.0])
+        with torch.no_grad():
+            for conv in [*head.m, *head.attn_m]:
+                conv.weight.zero_()
+                conv.bias.zero_()
+            # no objects anywhere...
+            for conv in head.m:
+                conv.bias.view(head.na, head.no)[:, 4] = -20
+            # ...but in red cells: objectness from the red channel, the class from the green one
+            weight = head.m[2].weight.view(head.na, head.no, 3)[0]
+            bias = head.m[2].bias.view(head.na, head.no)[0]
+            weight[4, 0], bias[4] = 40, -30
+            weight[5, 1], bias[5] = 20, -10
+            weight[6, 1], bias[6] = -20, 10
+
+        # the features are the mean colors of the cells
+        self.model = torch.nn.ModuleList(
+            [torch.nn.AvgPool2d(s) for s in (8, 16, 32)] + [head]
+        )
+        # uniform attention over constant bases (including the semantic output): masks are positive in the whole box
+        self.bases = torch.nn.Conv2d(3, num_base - 1, 1)
+        self.sem = torch.nn.Conv2d(3, 1, 1)
+        for conv in (self.bases, self.sem):
+            torch.nn.init.zeros_(conv.weight)
+            torch.nn.init.constant_(conv.bias, 10)
+        self.names = ["person", "robot"]
+        self.pooler_scale = 1 / 8
+
+    def forward(self, x):
+        features = [pool(x) for pool in self.model[:-1]]
+        return self.model[-1](
+            [features, self.bases(features[0]), self.sem(features[0])]
+        )
+
+
+def test_detect_batch(make_detector) -> None:
+    detector = make_detector(_SquareDetectorModel(), input_shape=(128, 192))
+    cell = np.array([64.0, 32.0, 96.0, 64.0])  # a stride-32 cell of the model input
+
+    # a white and a red square on images of different aspect ratios, both letterboxed onto the cell
+    images, expected_boxes = [], []
+    for shape, color in [((240, 320), (255, 255, 255)), ((300, 200), (0, 0, 255))]:
+        lb = LetterboxTransform.for_shape(
+            shape, detector.input_shape, stride=YOLOv7.STRIDE, auto=False
+        )
+        x_1, y_1, x_2, y_2 = lb.letterbox_to_image(cell.copy())
+        image = np.zeros((*shape, 3), dtype=np.uint8)
+        # slightly larger than the cell, to cover it fully once resized
+        image[int(y_1) - 2 : int(y_2) + 3, int(x_1) - 2 : int(x_2) + 3] = color
+        images.append(image)
+        expected_boxes.append((x_1, y_1, x_2 - x_1, y_2 - y_1))
+
+    batch_detections = detector.detect_batch(images)
+
+    assert [[d.class_name for d in detections] for detections in batch_detections] == [
+        ["person"],
+        ["robot"],
+    ]
+    for (detection,), image, expected_box in zip(
+        batch_detections, images, expected_boxes
+    ):
+        assert detection.confidence > 0.5
+        # boxes are mapped back to the original images
+        assert np.allclose(detection.box, expected_box, atol=1e-2)
+
+        # the mask fills the box, in the crop and in the full-frame mask
+        assert np.allclose(detection.mask_box, expected_box, atol=2)
+        mask = detection.mask
+        assert mask.shape == image.shape[:2]
+        ys, xs = np.nonzero(mask)
+        assert np.allclose(
+            (xs.min(), ys.min(), xs.max() + 1 - xs.min(), ys.max() + 1 - ys.min()),
+            detection.mask_box,
+            atol=1,
+        )
+
+    # other classes are dropped
+    batch_detections = detector.detect_batch(images, classes=[1])
+    assert [[d.class_name for d in detections] for detections in batch_detections] == [
+        [],
+        ["robot"],
+    ]
@@ -1,20 +1,47 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from workspace_monitor.options import (
+    DetectorBackend,
+    FrameFormat,
+    JpegBackend,
+    PayloadFormat,
+    Precision,
+)
+
 
 class LiveKitConfig(BaseModel):
     identity: str
     """Identity of this client"""
     room_name: str
     """Name of the room to connect to"""
-    track_name: str
+    track_name: str | None = None
     """Name of the track in the room to subscribe to"""
+    track_names: list[str] = []
+    """Names of several tracks (cameras) in the room to subscribe to, processed together. Overrides `track_name`"""
     url: str
     """URL of the LiveKit server"""
     api_key: str
     """API key for the LiveKit server"""
     api_secret: str
     """API secret for the LiveKit server"""
+    frame_format: FrameFormat = "i420"
+    """Format of the frames requested from LiveKit: "i420" (as decoded, converted once) or "rgb24" (converted by LiveKit)"""
+    max_frame_height: int | None = None
+    """If set, taller frames are downscaled to this height on ingest, before detection and publishing"""
+
+    @model_validator(mode="after")
+    def _check_tracks(self):
+        if not self.tracks:
+            raise ValueError("Either track_name or track_names must be set")
+        return self
+
+    @property
+    def tracks(self) -> list[str]:
+        """Names of all the tracks to subscribe to"""
+        if self.track_names:
+            return self.track_names
+        return [self.track_name] if self.track_name else []
 
 
 class MqttConfig(BaseModel):
@@ -23,7 +50,7 @@ class MqttConfig(BaseModel):
     port: int
     """Port of the MQTT broker"""
     topic: str
-    """Topic to publish the workspace state to"""
+    """Topic to publish the workspace state to. With several cameras, each camera publishes to `<topic>/<track name>`"""
     username: str | None = None
     """Username for the MQTT broker"""
     password: str | None = None
@@ -33,10 +60,79 @@ class MqttConfig(BaseModel):
 class MonitorConfig(BaseModel):
     tracked_objects: list[str]
     """List of object classes to track in the workspace"""
+    input_shape: tuple[int, int] | None = None
+    """Fixed (height, width) of the model input, multiples of 64, e.g. [384, 640] for 16:9 cameras.
+    If not set, the input shape follows the aspect ratio of the frames"""
+    backend: DetectorBackend = "eager"
+    """Backend running the model: "eager", "torchscript" or "compile" (the latter two require `input_shape`),
+    or "onnxruntime" / "onnxruntime-int8" (require the `onnx` extra and the model exported to `yolov7-mask.onnx`,
+    or quantized to `yolov7-mask.int8.onnx`)"""
+    precision: Precision = "fp32"
+    """Precision of the model: "fp32", "fp16" (GPUs) or "bf16" (CPUs with native bfloat16 support), fp32 only for ONNX"""
+    scene_change_threshold: float | None = None
+    """If set, frames differing from the last inferred frame in less than this fraction of pixels (e.g. 0.01)
+    skip the detector while there are no intrusions, their states reuse the previous intrusions"""
+    scene_change_max_interval: float = 2.0
+    """Maximum time between two inferences of a camera with the scene change filter, in seconds"""
 
 
-class Config(BaseSettings):
+class PublisherConfig(BaseModel):
+    jpeg_backend: JpegBackend = "opencv"
+    """JPEG encoder for the published frames: "opencv", "pillow" or "turbojpeg" (requires PyTurboJPEG)"""
+    jpeg_quality: int = 75
+    """JPEG quality of the published frames, 1 (worst) to 100 (best)"""
+    frame_scale: float = 1.0
+    """Factor to downscale the published frames by, 1 keeps the original resolution"""
+    payload_format: PayloadFormat = "json"
+    """Wire format of the published messages: "json" (base64 encoded frame) or "binary" (raw JPEG frame)"""
+    frame_interval: float | None = None
+    """If set, frames are published to `<topic>/frame` instead of with every workspace state:
+    at most once per `frame_interval` seconds, when the intrusions change, or on request (`<topic>/frame/request`)"""
+
+
+class PipelineConfig(BaseModel):
+    publish_queue_size: int = 2
+    """Maximum number of processed workspace states waiting to be published, the oldest ones are dropped first"""
+    idle_fps: float | None = None
+    """If set, the inference runs at this rate (frames per second) while there are no intrusions,
+    and at `active_fps` after one appears. If not set, the inference always runs as fast as possible"""
+    active_fps: float | None = None
+    """Inference rate with intrusions (with `idle_fps`), as fast as possible if not set"""
+    active_hold_off: float = 10.0
+    """Time to keep the active inference rate after the last intrusion, in seconds"""
+    frame_timeout: float = 1.0
+    """Maximum time to wait for new frames of all cameras before each inference, in seconds.
+    Cameras without a new frame by then are skipped, their last state is published again as a heartbeat"""
 
+    @model_validator(mode="after")
+    def _check_rates(self):
+        if self.idle_fps is None:
+            ignored = [
+                name
+                for name in ("active_fps", "active_hold_off")
+                if name in self.model_fields_set
+            ]
+            if ignored:
+                raise ValueError(
+                    f"Set idle_fps to use {' and '.join(ignored)}, the active rate only applies on top of the idle one"
+                )
+        return self
+
+
+class ThreadsConfig(BaseModel):
+    detector: int | None = None
+    """Number of threads the detector runs the model with (PyTorch intra-op or ONNX Runtime), their default if not set"""
+    detector_interop: int | None = None
+    """Number of PyTorch inter-op threads, PyTorch's default if not set"""
+    opencv: int = 0
+    """Number of threads of OpenCV (resizing, colour conversion, JPEG encoding), 0 for none (the default)"""
+    inference_cpus: list[int] = []
+    """CPUs to pin the inference (main thread and the detector's threads) to, no pinning if empty"""
+    io_cpus: list[int] = []
+    """CPUs to pin the I/O (LiveKit streams, MQTT and publishing threads) to, no pinning if empty"""
+
+
+class Config(BaseSettings):
     class Config:  # <- pydantic's BaseSettings configuration
         env_file = ".env"
         env_nested_delimiter = "__"
@@ -44,4 +140,7 @@ class Config(BaseSettings):
     livekit: LiveKitConfig
     mqtt: MqttConfig
     monitor: MonitorConfig
+    publisher: PublisherConfig = PublisherConfig()
+    pipeline: PipelineConfig = PipelineConfig()
+    threads: ThreadsConfig = ThreadsConfig()
     debug: bool = False
@@ -1,6 +1,8 @@
+import dataclasses
 import logging
-
 import os
+import time
+
 import cv2
 import tyro
 from dotenv import load_dotenv
@@ -8,11 +10,23 @@ from rich.logging import RichHandler
 from rich import print
 
 from workspace_monitor.config import Config
-from workspace_monitor.video_stream.livekit_video_stream import LiveKitVideoStream
+from workspace_monitor.utils import (
+    JpegEncoder,
+    configure_threads,
+    current_thread_cpus,
+    pin_current_thread,
+)
+from workspace_monitor.video_stream.livekit_video_stream import (
+    LiveKitVideoStream,
+    wait_for_new_frames,
+)
+from workspace_monitor.workers.publishing_worker import PublishingWorker
+from workspace_monitor.workers.rate_controller import InferenceRateController
+from workspace_monitor.workers.scene_change_filter import SceneChangeFilter
 from workspace_monitor.workers.workspace_state_publisher import (
     WorkspaceStatePublisher,
 )
-from workspace_monitor.workers.workspace_monitor import WorkspaceMonitor
+from workspace_monitor.workers.workspace_monitor import WorkspaceMonitor, WorkspaceState
 
 
 log = logging.getLogger(__name__)
@@ -23,20 +37,38 @@ def main(cfg: Config):
     Tool to monitor a LiveKit video stream for objects of interest and publish the detections to an MQTT broker.
     """
 
-    streamer = LiveKitVideoStream(
-        url=cfg.livekit.url,
-        identity=cfg.livekit.identity,
-        room_name=cfg.livekit.room_name,
-        track_name=cfg.livekit.track_name,
-        api_key=cfg.livekit.api_key,
-        api_secret=cfg.livekit.api_secret,
-        timeout=5,
-    )
-    streamer.start()
+    tracks = cfg.livekit.tracks
+    multi_camera = len(tracks) > 1
 
-    monitor = WorkspaceMonitor(
-        tracked_objects=["person"],
+    # size the thread pools before anything runs in parallel, so that PyTorch, OpenCV and LiveKit don't oversubscribe
+    # the cores, and pin the I/O threads (started from here on, they inherit the affinity) away from the inference
+    configure_threads(
+        torch_threads=cfg.threads.detector,
+        torch_interop_threads=cfg.threads.detector_interop,
+        opencv_threads=cfg.threads.opencv,
     )
+    process_cpus = current_thread_cpus()
+    pin_current_thread(cfg.threads.io_cpus)
+
+    # one stream per camera
+    # each stream joins the room on its own, with a distinct identity (LiveKit disconnects duplicate identities)
+    streamers = []
+    for track_name in tracks:
+        streamer = LiveKitVideoStream(
+            url=cfg.livekit.url,
+            identity=f"{cfg.livekit.identity}-{track_name}"
+            if multi_camera
+            else cfg.livekit.identity,
+            room_name=cfg.livekit.room_name,
+            track_name=track_name,
+            api_key=cfg.livekit.api_key,
+            api_secret=cfg.livekit.api_secret,
+            timeout=5,
+            frame_format=cfg.livekit.frame_format,
+            max_height=cfg.livekit.max_frame_height,
+        )
+        streamer.start()
+        streamers.append(streamer)
 
     publisher = WorkspaceStatePublisher(
         broker_address=cfg.mqtt.broker,
@@ -44,41 +76,168 @@ def main(cfg: Config):
         topic=cfg.mqtt.topic,
         username=cfg.mqtt.username,
         password=cfg.mqtt.password,
+        encoder=JpegEncoder(
+            backend=cfg.publisher.jpeg_backend,
+            quality=cfg.publisher.jpeg_quality,
+            scale=cfg.publisher.frame_scale,
+        ),
+        payload_format=cfg.publisher.payload_format,
+        frame_interval=cfg.publisher.frame_interval,
     )
     publisher.connect()
 
+    # frames are captured by the streams' own threads and published by worker threads (one per camera),
+    # so the main thread only runs the inference, back-to-back
+    publishing_workers = [
+        PublishingWorker(
+            publisher,
+            topic=f"{cfg.mqtt.topic}/{track_name}" if multi_camera else cfg.mqtt.topic,
+            queue_size=cfg.pipeline.publish_queue_size,
+        )
+        for track_name in tracks
+    ]
+    for publishing_worker in publishing_workers:
+        publishing_worker.start()
+
+    # the I/O threads are all started, the rest of the main thread (and the detector's thread pool) runs the inference
+    # on its own CPUs, or on all of them if only the I/O is pinned
+    pin_current_thread(cfg.threads.inference_cpus or process_cpus)
+
+    # a single monitor (and model) is shared by all cameras
+    # loaded after the I/O threads are started, so that the detector's threads are created with the inference affinity
+    monitor = WorkspaceMonitor(
+        tracked_objects=cfg.monitor.tracked_objects,
+        input_shape=cfg.monitor.input_shape,
+        backend=cfg.monitor.backend,
+        precision=cfg.monitor.precision,
+        num_threads=cfg.threads.detector,
+        scene_change_filter=(
+            SceneChangeFilter(
+                threshold=cfg.monitor.scene_change_threshold,
+                max_interval=cfg.monitor.scene_change_max_interval,
+            )
+            if cfg.monitor.scene_change_threshold is not None
+            else None
+        ),
+    )
+
+    # paces the inference: slow while the workspace is idle, fast when someone is in it
+    rate_controller = (
+        InferenceRateController(
+            idle_fps=cfg.pipeline.idle_fps,
+            active_fps=cfg.pipeline.active_fps,
+            hold_off=cfg.pipeline.active_hold_off,
+        )
+        if cfg.pipeline.idle_fps is not None
+        else None
+    )
+
+    # sequence numbers of the last processed frames, so that no frame is processed twice
+    frame_seqs = [0] * len(streamers)
+    # cameras without new frames: their last state is published again as a heartbeat, once per frame timeout
+    stale_cameras: set[int] = set()
+    last_states: list[WorkspaceState | None] = [None] * len(streamers)
+    last_publish_times = [0.0] * len(streamers)
+
     while True:
-        frame = streamer.get_latest_frame()
-        if frame is None:
+        if rate_controller is not None:
+            rate_controller.wait()
+
+        # a stalled camera does not hold back the others, the frames of the others are processed without it
+        stream_frames = wait_for_new_frames(
+            streamers,
+            frame_seqs,
+            timeout=cfg.pipeline.frame_timeout,
+            stalled=stale_cameras,
+        )
+        if stream_frames is None:
             # video stream is over
             break
 
-        # process the frame
+        for camera, (track_name, stream_frame) in enumerate(zip(tracks, stream_frames)):
+            if stream_frame is None and camera not in stale_cameras:
+                log.warning(
+                    f"No new frame from '{track_name}' within {cfg.pipeline.frame_timeout} seconds, "
+                    f"publishing its last state until it recovers"
+                )
+                stale_cameras.add(camera)
+            elif stream_frame is not None and camera in stale_cameras:
+                log.info(f"Receiving frames from '{track_name}' again")
+                stale_cameras.remove(camera)
+
+        cameras = [
+            camera
+            for camera, stream_frame in enumerate(stream_frames)
+            if stream_frame is not None
+        ]
+        frames = [stream_frames[camera].image for camera in cameras]
+        for camera in cameras:
+            frame_seqs[camera] = stream_frames[camera].seq
+
+        # process the frames of all cameras in a single batch
         try:
-            workspace_state = monitor.process(frame)
+            processed_states = (
+                monitor.process_batch(
+                    frames,
+                    timestamps=[stream_frames[camera].timestamp for camera in cameras],
+                    cameras=cameras,
+                )
+                if cameras
+                else []
+            )
         except RuntimeError as e:
             # there's a rare exception when torch fails to process YOLOv7 model output - just try again with the next frame
             log.error(f"Error processing frame: {e}")
             continue
 
-        if len(workspace_state.intrusions) <= 0:
-            log.info("Processed workspace state: no intrusions")
-        else:
-            intrusion_names = [i.class_name for i in workspace_state.intrusions]
-            log.info(
-                f"Processed workspace state: {len(workspace_state.intrusions)} intrusions\n"
-                f"  {intrusion_names}"
+        for camera, workspace_state in zip(cameras, processed_states):
+            track_name = tracks[camera]
+            if workspace_state.reused:
+                log.debug(
+                    f"Workspace state of '{track_name}' unchanged, skipped inference"
+                )
+            elif len(workspace_state.intrusions) <= 0:
+                log.info(f"Processed workspace state of '{track_name}': no intrusions")
+            else:
+                intrusion_names = [i.class_name for i in workspace_state.intrusions]
+                log.info(
+                    f"Processed workspace state of '{track_name}': {len(workspace_state.intrusions)} intrusions\n"
+                    f"  {intrusion_names}"
+                )
+            last_states[camera] = workspace_state
+
+        # heartbeats of the stale cameras, their last frame and intrusions
+        heartbeats = [
+            camera
+            for camera in stale_cameras
+            if last_states[camera] is not None
+            and time.monotonic() - last_publish_times[camera]
+            >= cfg.pipeline.frame_timeout
+        ]
+        for camera in heartbeats:
+            last_states[camera] = dataclasses.replace(last_states[camera], reused=True)
+            log.debug(
+                f"Publishing the last workspace state of '{tracks[camera]}' again"
             )
 
-        # send detection results to the MQTT endpoint
-        publisher.publish_state(workspace_state)
-        log.info("Published update to MQTT broker")
+        for camera in [*cameras, *heartbeats]:
+            # send detection results to the MQTT endpoint
+            publishing_workers[camera].submit(last_states[camera])
+            last_publish_times[camera] = time.monotonic()
+
+        if rate_controller is not None:
+            # only the states of this tick, a stalled camera's intrusions would keep the active rate indefinitely
+            rate_controller.update(any(state.intrusions for state in processed_states))
 
         if cfg.debug:
-            # display the frame
-            cv2.imshow(str(streamer), frame)
+            # display the new frames
+            for camera, frame in zip(cameras, frames):
+                cv2.imshow(str(streamers[camera]), frame)
             cv2.waitKey(1)
 
+    for publishing_worker in publishing_workers:
+        publishing_worker.stop()
+
 
 def cli():
     logging.basicConfig(
@@ -22,7 +22,8 @@ from .torch_utils import init_torch_seeds
 # Settings
 torch.set_printoptions(linewidth=320, precision=5, profile='long')
 np.set_printoptions(linewidth=320, formatter={'float_kind': '{:11.5g}'.format})  # format short g, %precision=5
-cv2.setNumThreads(0)  # prevent OpenCV from multithreading (incompatible with PyTorch DataLoader)
+# OpenCV's threads are set by workspace_monitor.utils.configure_threads (THREADS.OPENCV), not on import:
+# unpickling a checkpoint imports this module again under `models.*` and would reset them
 os.environ['NUMEXPR_MAX_THREADS'] = str(min(os.cpu_count(), 8))  # NumExpr max threads
 
 
@@ -920,6 +921,91 @@ def non_max_suppression_mask_conf(prediction, attn, bases, pooler, hyp, conf_thr
     return output, output_mask, output_mask_score, output_ac, output_ab
 
 
+def non_max_suppression_mask_conf_batched(prediction, attn, bases, pooler, hyp, conf_thres=0.1, iou_thres=0.6, classes=None,
+                                          agnostic=False, mask_iou=None):
+    """Runs Non-Maximum Suppression (NMS) on inference results of a whole batch at once
+
+    Same as non_max_suppression_mask_conf() without merge/vote, but candidate filtering, ROI pooling, mask merging
+    and NMS are done for all the images in a single pass, results are only split per image at the end.
+    Candidates which can't reach conf_thres for any of the given classes are dropped before their masks are merged.
+
+    Returns:
+         per-image lists of detections (n,6) [xyxy, conf, cls], mask predictions (n,mask_resolution**2)
+         and mask scores (n,1), None for images without detections
+    """
+    if prediction.dtype is torch.float16:
+        prediction = prediction.float()  # to FP32
+    bs = prediction.shape[0]  # batch size
+    nc = prediction.shape[2] - 5  # number of classes
+    max_det = 300  # maximum number of detections per image
+    multi_label = nc > 1  # multiple labels per box (adds 0.5ms/img)
+
+    output = [None] * bs
+    output_mask = [None] * bs
+    output_mask_score = [None] * bs
+
+    # Candidates of all images, flattened
+    bi, ai = (prediction[..., 4] > conf_thres).nonzero(as_tuple=True)  # image index, anchor index
+    x = prediction[bi, ai]
+
+    # Early exit for candidates that can't pass the confidence threshold (for any of the requested classes),
+    # mask_score <= 1 so obj_conf * cls_conf is an upper bound of the final confidence
+    cls_conf = x[:, 5:] if not classes else x[:, [c + 5 for c in classes]]
+    k = (cls_conf * x[:, 4:5] > conf_thres).any(1)
+    bi, ai, x = bi[k], ai[k], x[k]
+    if not bi.shape[0]:
+        return output, output_mask, output_mask_score
+    box = xywh2xyxy(x[:, :4])  # (center x, center y, width, height) to (x1, y1, x2, y2)
+    a = attn[bi, ai]
+
+    # ROIs in (image index, x1, y1, x2, y2) format pool from the right image of the batch
+    pooled_bases = pooler(bases, torch.cat((bi[:, None].to(box.dtype), box), 1))
+    pred_masks = merge_bases(pooled_bases, a, hyp["attn_resolution"], hyp["num_base"]).view(a.shape[0], -1).sigmoid()
+
+    if mask_iou is not None:
+        mask_score = mask_iou[bi, ai][..., None]
+    else:
+        temp = pred_masks.clone()
+        temp[temp < 0.5] = 1 - temp[temp < 0.5]
+        mask_score = torch.exp(torch.log(temp).mean(dim=-1, keepdims=True))
+
+    x[:, 5:] *= x[:, 4:5] * mask_score  # conf = obj_conf * cls_conf * mask_conf
+
+    if multi_label:
+        i, j = (x[:, 5:] > conf_thres).nonzero(as_tuple=False).T
+        x = torch.cat((box[i], x[i, j + 5, None], j[:, None].float()), 1)
+    else:  # best class only
+        conf, j = x[:, 5:].max(1, keepdim=True)
+        i = (conf.view(-1) > conf_thres).nonzero(as_tuple=False).view(-1)
+        x = torch.cat((box, conf, j.float()), 1)[i]
+    bi, pred_masks, mask_score = bi[i], pred_masks[i], mask_score[i]
+
+    # Filter by class
+    if classes:
+        k = (x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)
+        x, bi, pred_masks, mask_score = x[k], bi[k], pred_masks[k], mask_score[k]
+
+    if not x.shape[0]:
+        return output, output_mask, output_mask_score
+
+    # Batched NMS, boxes only suppress boxes of the same image (and class, unless agnostic)
+    # a single NMS call on boxes offset per group, torchvision's batched_nms() loops over groups for large inputs on CPU
+    groups = bi if agnostic else bi * nc + x[:, 5].long()
+    offsets = groups[:, None].to(x.dtype) * (x[:, :4].max() + 1)
+    i = torchvision.ops.nms(x[:, :4] + offsets, x[:, 4], iou_thres)  # sorted by decreasing score
+
+    # Split per image
+    bi = bi[i]
+    for xi in range(bs):
+        k = i[bi == xi][:max_det]  # limit detections
+        if k.shape[0]:
+            output[xi] = x[k]
+            output_mask[xi] = pred_masks[k]
+            output_mask_score[xi] = mask_score[k]
+
+    return output, output_mask, output_mask_score
+
+
 def strip_optimizer(f='best.pt', s=''):  # from utils.general import *; strip_optimizer()
     # Strip optimizer from 'f' to finalize training, optionally save as 's'
     x = torch.load(f, map_location=torch.device('cpu'))
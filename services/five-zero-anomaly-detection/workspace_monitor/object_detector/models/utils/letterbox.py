@@ -1,3 +1,6 @@
+from dataclasses import dataclass
+from functools import lru_cache
+
 import cv2
 import numpy as np
 
@@ -33,3 +36,86 @@ def letterbox(img, new_shape=(640, 640), color=(0, 0, 0), auto=True, scaleFill=F
     left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
     img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)  # add border
     return img, ratio, (dw, dh)
+
+
+
+@dataclass(frozen=True)
+class LetterboxTransform:
+    # Maps an image of a given shape to its letterbox (as letterbox() does) and coordinates between the two
+    image_shape: tuple[int, int]  # [height, width] of the original image
+    resized_shape: tuple[int, int]  # [height, width] of the resized image
+    offset: tuple[int, int]  # [top, left] position of the resized image in the letterboxed image
+    shape: tuple[int, int]  # [height, width] of the letterboxed image
+    padding: tuple[float, float]  # wh padding on each side, as returned by letterbox()
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def for_shape(shape, new_shape=(640, 640), auto=True, scaleFill=False, scaleup=True, stride=32):
+        # Letterbox of an image of the given [height, width], computed once per shape (and settings)
+        if isinstance(new_shape, int):
+            new_shape = (new_shape, new_shape)
+
+        # Scale ratio (new / old)
+        r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
+        if not scaleup:  # only scale down, do not scale up (for better test mAP)
+            r = min(r, 1.0)
+
+        # Compute padding
+        new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+        dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]  # wh padding
+        if auto:  # minimum rectangle
+            dw, dh = np.mod(dw, stride), np.mod(dh, stride)  # wh padding
+        elif scaleFill:  # stretch
+            dw, dh = 0.0, 0.0
+            new_unpad = (new_shape[1], new_shape[0])
+
+        dw /= 2  # divide padding into 2 sides
+        dh /= 2
+
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        return LetterboxTransform(
+            image_shape=(int(shape[0]), int(shape[1])),
+            resized_shape=(new_unpad[1], new_unpad[0]),
+            offset=(top, left),
+            shape=(new_unpad[1] + top + bottom, new_unpad[0] + left + right),
+            padding=(float(dw), float(dh)),
+        )
+
+    @property
+    def scale(self):
+        # wh scale ratios (resized / original), rounding of the resized shape included
+        return self.resized_shape[1] / self.image_shape[1], self.resized_shape[0] / self.image_shape[0]
+
+    def resize(self, img, dst=None):
+        # Resize the image to the inner (unpadded) part of the letterbox, optionally into a preallocated dst
+        if img.shape[:2] == self.resized_shape:
+            return img
+        return cv2.resize(img, self.resized_shape[::-1], dst=dst, interpolation=cv2.INTER_LINEAR)
+
+    def image_to_letterbox(self, boxes):
+        # xyxy boxes (numpy or torch, modified in place) in the original image -> in the letterboxed image
+        (sx, sy), (top, left) = self.scale, self.offset
+        boxes[..., 0::2] *= sx
+        boxes[..., 1::2] *= sy
+        boxes[..., 0::2] += left
+        boxes[..., 1::2] += top
+        return boxes
+
+    def letterbox_to_resized(self, boxes):
+        # xyxy boxes (numpy or torch, modified in place) in the letterboxed image -> in the resized image
+        top, left = self.offset
+        boxes[..., 0::2] -= left
+        boxes[..., 1::2] -= top
+        return boxes
+
+    def resized_to_image(self, boxes):
+        # xyxy boxes (numpy or torch, modified in place) in the resized image -> in the original image
+        sx, sy = self.scale
+        boxes[..., 0::2] /= sx
+        boxes[..., 1::2] /= sy
+        return boxes
+
+    def letterbox_to_image(self, boxes):
+        # xyxy boxes (numpy or torch, modified in place) in the letterboxed image -> in the original image
+        return self.resized_to_image(self.letterbox_to_resized(boxes))
@@ -390,6 +390,16 @@ class MT(nn.Module):
 
         return output
 
+    def precompute_grids(self, img_size, device=None):
+        # static input shape: build the grids of all detection layers once for (height, width) inputs,
+        # forward() then reuses them for every batch instead of checking for and building new ones
+        h, w = img_size
+        for i in range(self.nl):
+            ny, nx = int(h // self.stride[i]), int(w // self.stride[i])
+            self.grid[i] = self._make_grid(nx, ny).to(
+                device if device is not None else self.anchor_grid.device, self.anchor_grid.dtype
+            )
+
     @staticmethod
     def _make_grid(nx=20, ny=20):
         yv, xv = torch.meshgrid([torch.arange(ny), torch.arange(nx)])
@@ -0,0 +1,279 @@
+"""
+YOLOv7-mask served by ONNX Runtime, and the export of the model to ONNX (optionally quantized to INT8).
+
+Usage (export):
+    uv run python -m workspace_monitor.object_detector.onnx_yolo_v7 --help
+"""
+
+import json
+import logging
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+from .models.utils.letterbox import LetterboxTransform
+from .yolo_v7 import YOLOv7, _fixed_shape_tracing, _InferenceOutputs
+
+try:
+    import onnx  # optional, for the export
+except ImportError:
+    onnx = None
+
+try:
+    import onnxruntime  # optional, for the inference
+except ImportError:
+    onnxruntime = None
+
+logger = logging.getLogger(__name__)
+
+ONNX_INPUT_NAME = "images"
+ONNX_OUTPUT_NAMES = ["predictions", "attn", "bases", "sem"]
+"""Outputs of the exported model: the MT head's inference output and attention, the mask bases and semantic output"""
+
+
+def export_onnx(detector: YOLOv7, onnx_file_path: Path, opset: int = 17) -> None:
+    """
+    Exports the backbone and head of the detector's model to ONNX, for `OnnxYOLOv7`.
+    The model is exported for the detector's fixed input shape, with a dynamic batch size.
+    Post-processing (NMS, mask merging and pasting) is not part of the exported model.
+
+    Args:
+        detector: Detector with a fixed input shape, its model should be fused.
+        onnx_file_path: Path of the ONNX file to write.
+        opset: ONNX opset version to export to.
+    """
+    if onnx is None:
+        raise RuntimeError("ONNX export requires the onnx package")
+    if detector.input_shape is None:
+        raise ValueError("ONNX export requires a detector with a fixed input shape")
+    if detector.precision != "fp32":
+        raise ValueError(
+            f"ONNX export requires a detector in fp32 precision, got {detector.precision}"
+        )
+
+    (h, w) = detector.input_shape
+    model = _InferenceOutputs(detector.model).eval()
+    example = torch.zeros((1, 3, h, w), device=detector.device)
+
+    logger.info(f"Exporting the model for {h}x{w} inputs to '{onnx_file_path}'...")
+    with _fixed_shape_tracing():
+        torch.onnx.export(
+            model,
+            (example,),
+            str(onnx_file_path),
+            input_names=[ONNX_INPUT_NAME],
+            output_names=ONNX_OUTPUT_NAMES,
+            dynamic_axes={
+                name: {0: "batch"} for name in [ONNX_INPUT_NAME, *ONNX_OUTPUT_NAMES]
+            },
+            opset_version=opset,
+            dynamo=False,
+        )
+
+    # the parts of the model needed by post-processing travel with the exported graph
+    model_proto = onnx.load(str(onnx_file_path))
+    onnx.helper.set_model_props(
+        model_proto,
+        {
+            "names": json.dumps(detector.names),
+            "pooler_scale": str(detector.pooler_scale),
+        },
+    )
+    onnx.save(model_proto, str(onnx_file_path))
+
+
+def quantize_onnx(
+    onnx_file_path: Path,
+    quantized_file_path: Path,
+    calibration_images: list[np.ndarray],
+) -> None:
+    """
+    Quantizes the model exported by `export_onnx` to INT8, for faster inference on CPUs.
+    Static post-training quantization: the weights of the convolutions are quantized per channel, and the ranges
+    of their activations are calibrated on the given images, preprocessed exactly like the detector's inputs.
+    The quantized model runs in `OnnxYOLOv7` like the original one.
+
+    Args:
+        onnx_file_path: Path to the exported model.
+        quantized_file_path: Path of the quantized ONNX file to write.
+        calibration_images: OpenCV images (BGR) representative of the inputs, e.g. frames of the workcell cameras.
+    """
+    if onnx is None or onnxruntime is None:
+        raise RuntimeError(
+            "ONNX quantization requires the onnx and onnxruntime packages"
+        )
+    from onnxruntime import quantization
+
+    input_dims = (
+        onnx.load(str(onnx_file_path)).graph.input[0].type.tensor_type.shape.dim
+    )
+    input_shape = (input_dims[2].dim_value, input_dims[3].dim_value)
+
+    class CalibrationDataReader(quantization.CalibrationDataReader):
+        def __init__(self):
+            self._inputs = _letterboxed_inputs(calibration_images, input_shape)
+
+        def get_next(self) -> dict[str, np.ndarray] | None:
+            return next(self._inputs, None)
+
+    logger.info(
+        f"Quantizing the model, calibrated on {len(calibration_images)} images..."
+    )
+    quantization.quantize_static(
+        str(onnx_file_path),
+        str(quantized_file_path),
+        CalibrationDataReader(),
+        quant_format=quantization.QuantFormat.QDQ,
+        # convolutions are nearly all of the model's compute, the rest of the graph stays in float
+        op_types_to_quantize=["Conv"],
+        per_channel=True,
+    )
+
+
+def _letterboxed_inputs(
+    images: list[np.ndarray], input_shape: tuple[int, int]
+) -> Iterator[dict[str, np.ndarray]]:
+    """
+    Model inputs for the images, one at a time, preprocessed like `YOLOv7._preprocess` does.
+    """
+    (h, w) = input_shape
+    for image in images:
+        lb = LetterboxTransform.for_shape(
+            image.shape[:2], input_shape, stride=YOLOv7.STRIDE, auto=False
+        )
+        (top, left), (resized_height, resized_width) = lb.offset, lb.resized_shape
+
+        x = np.zeros((1, 3, h, w), dtype=np.float32)
+        # HWC BGR uint8 -> CHW RGB float in [0, 1]
+        x[0, :, top : top + resized_height, left : left + resized_width] = (
+            lb.resize(image)[..., ::-1].transpose(2, 0, 1) / 255
+        )
+        yield {ONNX_INPUT_NAME: x}
+
+
+def read_calibration_frames(video_file_path: Path, count: int) -> list[np.ndarray]:
+    """
+    Reads frames spread evenly over the recorded video, for calibrating the quantization.
+    """
+    capture = cv2.VideoCapture(str(video_file_path))
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video file '{video_file_path}'")
+
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    frames = []
+    for index in np.linspace(0, max(frame_count - 1, 0), count).astype(int):
+        capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = capture.read()
+        if ret:
+            frames.append(frame)
+    capture.release()
+
+    return frames
+
+
+class OnnxYOLOv7(YOLOv7):
+    def __init__(
+        self,
+        onnx_file_path: Path,
+        hyperparameters_file_path: Path,
+        num_threads: int | None = None,
+    ):
+        """
+        Initializes a YOLOv7 detector running the model exported by `export_onnx` with ONNX Runtime, on the CPU.
+        The detector has the same interface as `YOLOv7`, and shares its pre- and post-processing.
+        Only the model's forward pass runs in ONNX Runtime, with all its graph optimizations.
+
+        Args:
+            onnx_file_path: Path to the exported model.
+            hyperparameters_file_path: Path to a YAML file containing the hyperparameters for the model.
+            num_threads: Number of threads ONNX Runtime runs the model with, ONNX Runtime's default if not given.
+        """
+        if onnxruntime is None:
+            raise RuntimeError(
+                "ONNX Runtime inference requires the onnxruntime package"
+            )
+
+        logger.info("Loading the ONNX model...")
+        start_time = time.perf_counter()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        self._session = onnxruntime.InferenceSession(
+            str(onnx_file_path), options, providers=["CPUExecutionProvider"]
+        )
+
+        # the model is exported for a fixed input shape, and runs in fp32 on the CPU
+        (_, _, h, w) = self._session.get_inputs()[0].shape
+        self._init_processing(hyperparameters_file_path, "cpu", (h, w), "fp32")
+
+        metadata = self._session.get_modelmeta().custom_metadata_map
+        self.names: list[str] = json.loads(metadata["names"])
+        self.pooler_scale: float = float(metadata["pooler_scale"])
+
+        self.backend = "onnxruntime"
+        self._forward = self._run_session
+
+        logger.info(
+            f"Loaded the ONNX model in {(time.perf_counter() - start_time) * 1000:.0f} ms."
+        )
+
+    def _run_session(self, image_tensor: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        # the tensors share their memory with the NumPy arrays, no copies on the way in or out
+        outputs = self._session.run(
+            ONNX_OUTPUT_NAMES, {ONNX_INPUT_NAME: image_tensor.numpy()}
+        )
+        return tuple(torch.from_numpy(output) for output in outputs)
+
+
+@dataclass
+class Args:
+    weights: Path
+    """Path to the YOLOv7-mask weights"""
+    hyperparameters: Path
+    """Path to the YAML file with the hyperparameters of the model"""
+    output: Path
+    """Path of the ONNX file to write, e.g. next to the weights as yolov7-mask.onnx"""
+    input_shape: tuple[int, int] = (384, 640)
+    """Fixed (height, width) of the model input, multiples of 64"""
+    opset: int = 17
+    """ONNX opset version"""
+    quantized_output: Path | None = None
+    """If set, the exported model is also quantized to INT8 and written to this path, e.g. yolov7-mask.int8.onnx"""
+    calibration_video: Path = (
+        Path(__file__).parent / "../../tests/resources/workcell_test_video.mp4"
+    )
+    """Recording of the workcell to calibrate the quantization on"""
+    calibration_frames: int = 64
+    """Number of frames of the recording to calibrate the quantization on"""
+
+
+def main(args: Args) -> None:
+    detector = YOLOv7(
+        weights_file_path=args.weights,
+        hyperparameters_file_path=args.hyperparameters,
+        device="cpu",
+        input_shape=args.input_shape,
+    )
+    export_onnx(detector, args.output, opset=args.opset)
+
+    if args.quantized_output is not None:
+        frames = read_calibration_frames(
+            args.calibration_video, args.calibration_frames
+        )
+        quantize_onnx(args.output, args.quantized_output, frames)
+
+
+if __name__ == "__main__":
+    import tyro
+
+    logging.basicConfig(level=logging.INFO)
+    main(tyro.cli(Args))
@@ -2,25 +2,41 @@
 This code is based on https://github.com/WongKinYiu/yolov7
 """
 
+import hashlib
 import logging
+import os
 import sys
+import tempfile
 import time
+import warnings
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
-from typing import Literal
+from typing import Literal, TypeVar
 
 import cv2
 import numpy as np
 import torch
 import yaml
-from torchvision import transforms
 from torchvision.ops import roi_align
 
-from .models.utils.letterbox import letterbox
-from .models.utils.general import non_max_suppression_mask_conf
+from ..options import InferenceBackend, Precision
+from .models.utils.letterbox import LetterboxTransform
+from .models.utils.general import non_max_suppression_mask_conf_batched
+from .utils import BoundingBox
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+_TORCH_DTYPES = {
+    "fp32": torch.float32,
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+}
+
 
 def auto_select_torch_device() -> Literal["cpu", "cuda", "mps"]:
     """
@@ -43,20 +59,167 @@ class Detection:
     Detection of an object in an image.
     """
 
-    mask: np.ndarray
-    """Binary mask of the detected object in the image."""
     class_name: str
     """Name of the class of the detected object."""
     confidence: float
     """Confidence of the detection."""
+    box: BoundingBox
+    """Bounding box predicted by the detector, (x, y, w, h) in pixels of the original image."""
+    mask_crop: np.ndarray
+    """Binary mask of the detected object, cropped to `mask_crop_box`, at the model's input resolution."""
+    mask_crop_box: tuple[int, int, int, int]
+    """Box (x1, y1, x2, y2) of the mask crop, in pixels of the image resized to the model's input resolution."""
+    letterbox: LetterboxTransform
+    """Letterbox of the original image into the model's input, maps the mask crop back to the original image."""
+
+    @cached_property
+    def mask_box(self) -> BoundingBox | None:
+        """
+        Tight bounding box of the mask, (x, y, w, h) in pixels of the original image, or None if the mask is empty.
+        Computed on the mask crop, without building the full-frame mask.
+        """
+        y_indices, x_indices = np.nonzero(self.mask_crop)
+        if len(x_indices) <= 0:
+            return None
+
+        crop_x, crop_y = self.mask_crop_box[:2]
+        box = np.array(
+            [
+                crop_x + x_indices.min(),
+                crop_y + y_indices.min(),
+                crop_x + x_indices.max() + 1,
+                crop_y + y_indices.max() + 1,
+            ],
+            dtype=np.float64,
+        )
+        x_1, y_1, x_2, y_2 = self.letterbox.resized_to_image(box)
+
+        return float(x_1), float(y_1), float(x_2 - x_1), float(y_2 - y_1)
+
+    @cached_property
+    def mask(self) -> np.ndarray:
+        """
+        Binary mask of the detected object in the original image.
+        Built from the mask crop on first access, only resizing the cropped region.
+        """
+        image_height, image_width = self.letterbox.image_shape
+
+        # crop box in the original image
+        crop_box = self.letterbox.resized_to_image(
+            np.array(self.mask_crop_box, dtype=np.float64)
+        )
+        x_1, y_1, x_2, y_2 = (round(v) for v in crop_box)
+        x_2, y_2 = min(x_2, image_width), min(y_2, image_height)
+
+        mask = np.zeros((image_height, image_width), dtype=bool)
+        if (x_2 > x_1) and (y_2 > y_1) and self.mask_crop.size:
+            mask[y_1:y_2, x_1:x_2] = cv2.resize(
+                self.mask_crop.astype(np.uint8),
+                (x_2 - x_1, y_2 - y_1),
+                interpolation=cv2.INTER_NEAREST,
+            ).astype(bool)
+
+        return mask
+
+
+def file_digest(file_path: Path) -> str:
+    """
+    Returns a short SHA-256 digest of the file's content, e.g. to key files derived from it.
+    """
+    with file_path.open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()[:16]
+
+
+def _cached_artifact(
+    file_path: Path,
+    build: Callable[[], T],
+    save: Callable[[T, Path], None],
+    load: Callable[[Path], T],
+    description: str,
+) -> T:
+    """
+    Loads an artifact derived from the model weights (e.g. the fused model) from its cache file,
+    or builds it and writes the cache file. The file should be named after the weights' hash, see `file_digest`,
+    so that it is never out of date.
+
+    The cache file is written to a temporary file next to it and moved into place, so that it is never seen
+    partially written. A cache file that fails to load, e.g. left truncated by an older version, is replaced.
+
+    Args:
+        file_path: Path of the cache file.
+        build: Builds the artifact if it is not cached.
+        save: Writes the artifact to the cache file.
+        load: Reads the artifact from the cache file.
+        description: Description of the artifact for the logs, e.g. "fused model".
+    """
+    if file_path.exists():
+        logger.info(f"Loading the {description} from '{file_path}'")
+        try:
+            return load(file_path)
+        except Exception as e:
+            logger.warning(
+                f"Failed to load the cached {description}, building it again: {e}"
+            )
+
+    artifact = build()
+    temp_file_path = None
+    try:
+        fd, temp_file_path = tempfile.mkstemp(
+            suffix=".tmp", prefix=f".{file_path.name}.", dir=file_path.parent
+        )
+        os.close(fd)
+        save(artifact, Path(temp_file_path))
+        os.replace(temp_file_path, file_path)
+        logger.info(f"Cached the {description} in '{file_path}'")
+    except OSError as e:
+        # e.g. read-only resources directory - built again on the next start
+        logger.warning(f"Failed to cache the {description}: {e}")
+    finally:
+        if temp_file_path is not None and os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+    return artifact
+
+
+@contextmanager
+def _fixed_shape_tracing() -> Iterator[None]:
+    """
+    Context for tracing the model for a fixed input shape, to TorchScript or ONNX.
+    The shape checks of the model are frozen into the trace, which is intended: their warnings are silenced.
+    """
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        yield
+
+
+class _InferenceOutputs(torch.nn.Module):
+    """
+    Wraps the model to return only the outputs used for inference, as a tuple of tensors,
+    which (unlike the model's dict, with its None values) can be traced and compiled.
+    """
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        output = self.model(x)
+        return output["test"], output["attn"], output["bases"], output["sem"]
 
 
 class YOLOv7:
+    STRIDE = 64
+    """Input images are letterboxed to multiples of this stride."""
+
     def __init__(
         self,
         weights_file_path: Path,
         hyperparameters_file_path: Path,
         device: Literal["cpu", "cuda", "mps"] = auto_select_torch_device(),
+        input_shape: tuple[int, int] | None = None,
+        fuse: bool = True,
+        backend: InferenceBackend = "eager",
+        precision: Precision = "fp32",
     ):
         """
         Initializes a YOLOv7 detector.
@@ -64,76 +227,257 @@ class YOLOv7:
         Args:
             weights_file_path: Path to the file containing the weights for the model.
             hyperparameters_file_path: Path to a YAML file containing the hyperparameters for the model.
+            device: Device to run the model on.
+            input_shape: Fixed (height, width) of the model input, multiples of 64.
+                Every image is letterboxed to exactly this shape, so the model always runs on the same input shape
+                and the grids of its detection head are built once. If not given, each image is letterboxed to the
+                smallest stride-aligned rectangle fitting in 640x640, which depends on the image's aspect ratio.
+            fuse: Whether to fuse the model for inference: Conv+BN layers are merged and RepConv layers are
+                reparameterized into single convolutions. The fused model is cached next to the weights file.
+            backend: Backend running the model, see `InferenceBackend`. Backends other than "eager" build
+                a static graph of the model, they require a fixed `input_shape`.
+            precision: Precision of the model's weights and inputs, see `Precision`.
         """
+        if backend != "eager" and input_shape is None:
+            raise ValueError(f"Backend '{backend}' requires a fixed input shape")
+
         logger.info("Loading the model...")
         start_time = time.perf_counter()
 
-        # load the hyperparameters
-        with hyperparameters_file_path.open() as f:
-            self.hyp = yaml.load(f, Loader=yaml.FullLoader)
+        self._init_processing(hyperparameters_file_path, device, input_shape, precision)
 
         # append the models directory to the system path for torch.load to work
         models_directory = Path(__file__).parent
         sys.path.append(str(models_directory))
 
         # load the model
-        self.device = torch.device(device)
-        weights = torch.load(str(weights_file_path), weights_only=False)
-        self.model = weights["model"]
-        self.model = self.model.float().to(self.device)
-        _ = self.model.eval()
+        model = self._load_model(weights_file_path, fuse=fuse)
+        self._init_model(model, weights_file_path, backend, fuse=fuse)
 
         logger.info(
             f"Loaded the model in {(time.perf_counter() - start_time) * 1000:.0f} ms."
         )
 
-    def detect(self, image: np.ndarray) -> list[Detection]:
+    def _init_processing(
+        self,
+        hyperparameters_file_path: Path,
+        device: str,
+        input_shape: tuple[int, int] | None,
+        precision: Precision,
+    ) -> None:
+        """
+        Initializes the state of the pre- and post-processing, shared by all the ways of running the model.
+        The model's class names and pooler scale are left to the caller, along with the forward pass itself.
+        """
+        if input_shape is not None and any(
+            v <= 0 or v % self.STRIDE for v in input_shape
+        ):
+            raise ValueError(
+                f"Input shape must be positive multiples of {self.STRIDE}, got {input_shape}"
+            )
+
+        # load the hyperparameters
+        with hyperparameters_file_path.open() as f:
+            self.hyp = yaml.load(f, Loader=yaml.FullLoader)
+
+        self.input_shape = input_shape
+        self.device = torch.device(device)
+        self.precision = precision
+        self.dtype = _TORCH_DTYPES[precision]
+
+        # reusable preprocessing buffers, see `_preprocess`
+        self._input_tensor: torch.Tensor | None = None
+        self._input_letterboxes: list[LetterboxTransform] | None = None
+        self._resize_buffers: dict[int, np.ndarray] = {}
+
+    def _init_model(
+        self,
+        model: torch.nn.Module,
+        weights_file_path: Path,
+        backend: InferenceBackend,
+        fuse: bool,
+    ) -> None:
+        """
+        Moves the loaded model to the device and precision set by `_init_processing`, and prepares its forward pass.
+
+        Args:
+            model: The YOLOv7-mask model, or any model with the same outputs, class names and pooler scale.
+            weights_file_path: Path to the weights file of the model, next to which the backend's files are cached.
+            backend: Backend running the model, see `InferenceBackend`.
+            fuse: Whether the model is fused, see `_load_model`.
+        """
+        self.model = model.to(self.device, self.dtype)
+        _ = self.model.eval()
+
+        if self.input_shape is not None:
+            self.model.model[-1].precompute_grids(self.input_shape, self.device)
+
+        # the parts of the model needed by post-processing
+        self.names: list[str] = list(self.model.names)
+        self.pooler_scale: float = self.model.pooler_scale
+
+        self.backend = backend
+        self._forward = self._build_backend(weights_file_path, backend, fuse=fuse)
+
+    @staticmethod
+    def _load_model(weights_file_path: Path, fuse: bool) -> torch.nn.Module:
+        """
+        Loads the model from the weights file, on the CPU, optionally fused for inference.
+        Fusing is done once per weights file, the fused model is cached next to it.
+        """
+
+        def load(file_path: Path) -> torch.nn.Module:
+            return torch.load(str(file_path), map_location="cpu", weights_only=False)[
+                "model"
+            ]
+
+        if not fuse:
+            return load(weights_file_path).float()
+
+        def build() -> torch.nn.Module:
+            model = load(weights_file_path).float().eval()
+            # merge BatchNorm layers into the preceding convolutions, and the branches of RepConv layers into one
+            with torch.no_grad():
+                model.fuse()
+            return model
+
+        return _cached_artifact(
+            weights_file_path.with_name(
+                f"{weights_file_path.stem}.fused-{file_digest(weights_file_path)}.pt"
+            ),
+            build=build,
+            save=lambda model, file_path: torch.save({"model": model}, str(file_path)),
+            load=load,
+            description="fused model",
+        )
+
+    def _build_backend(
+        self, weights_file_path: Path, backend: InferenceBackend, fuse: bool
+    ) -> Callable[[torch.Tensor], tuple[torch.Tensor, ...]]:
+        """
+        Prepares the forward pass of the model for the backend, see `InferenceBackend`.
+        The TorchScript model is traced once per weights file, input shape, device and precision,
+        and cached next to the weights.
+
+        Returns:
+            The forward pass, returning the model's inference, attention, bases and semantic outputs.
+        """
+        model = _InferenceOutputs(self.model).eval()
+        if backend == "eager":
+            return model
+
+        (h, w) = self.input_shape
+        example = torch.zeros((1, 3, h, w), dtype=self.dtype, device=self.device)
+
+        if backend == "torchscript":
+
+            def trace() -> torch.jit.ScriptModule:
+                logger.info(f"Tracing the model for {h}x{w} inputs...")
+                with _fixed_shape_tracing():
+                    return torch.jit.freeze(
+                        torch.jit.trace(model, example, check_trace=False)
+                    )
+
+            forward = _cached_artifact(
+                weights_file_path.with_name(
+                    f"{weights_file_path.stem}.{'fused-' if fuse else ''}{file_digest(weights_file_path)}"
+                    f".torchscript-{h}x{w}-{self.device.type}-{self.precision}.pt"
+                ),
+                build=trace,
+                save=lambda traced, file_path: torch.jit.save(traced, str(file_path)),
+                load=lambda file_path: torch.jit.load(
+                    str(file_path), map_location=self.device
+                ),
+                description="TorchScript model",
+            )
+        elif backend == "compile":
+            logger.info(f"Compiling the model for {h}x{w} inputs...")
+            forward = torch.compile(model)
+        else:
+            raise ValueError(f"Unknown inference backend '{backend}'")
+
+        # TorchScript optimizes the graph over the first runs, and torch.compile compiles on the first one
+        # run them now rather than on the first frames
+        # torch.compile specializes the graph for single images, batches of several images share one graph
+        # compiled for a dynamic batch size, so that the number of cameras does not trigger recompilations
+        batch_example = torch.zeros((2, 3, h, w), dtype=self.dtype, device=self.device)
+        torch._dynamo.mark_dynamic(batch_example, 0)
+        with torch.no_grad():
+            for _ in range(2):
+                forward(example)
+                forward(batch_example)
+
+        return forward
+
+    def class_indices(self, class_names: list[str]) -> list[int]:
+        """
+        Looks up the model's class indices of the given class names.
+
+        Args:
+            class_names: Names of the classes, e.g. "person".
+
+        Returns:
+            Indices of the classes, in the same order as the names.
+        """
+        unknown = [n for n in class_names if n not in self.names]
+        if unknown:
+            raise RuntimeError(f"Classes {unknown} are not known to the model")
+
+        return [self.names.index(n) for n in class_names]
+
+    def detect(
+        self, image: np.ndarray, classes: list[int] | None = None
+    ) -> list[Detection]:
         """
         Runs inference on the given image.
 
         Args:
-            image: Image to detect people in.
+            image: OpenCV image (BGR) to detect people in.
+            classes: Indices of the classes to detect (see `class_indices`), all classes if not given.
 
         Returns:
             OpenCV contours of the detected people.
         """
+        return self.detect_batch([image], classes=classes)[0]
 
-        logger.debug("Running inference...")
-        start_time = time.perf_counter()
+    def detect_batch(
+        self, images: list[np.ndarray], classes: list[int] | None = None
+    ) -> list[list[Detection]]:
+        """
+        Runs inference on several images at once, in a single forward pass of the model.
+        Images may have different resolutions.
 
-        # get original image size
-        original_height, original_width = image.shape[:2]
+        Args:
+            images: OpenCV images (BGR) to detect objects in, e.g. the latest frames from several cameras.
+            classes: Indices of the classes to detect (see `class_indices`), all classes if not given.
+                Detections of other classes are dropped in NMS, before their masks are built.
 
-        # prepare image tensor
-        image_letterboxed, _, (letterbox_w_padding, letterbox_h_padding) = letterbox(
-            image, 640, stride=64, auto=True
-        )
-        image_tensor = transforms.ToTensor()(image_letterboxed)
-        image_tensor = torch.tensor(np.array([image_tensor.numpy()]))
-        image_tensor = image_tensor.to(self.device)
-        image_tensor = image_tensor.float()
+        Returns:
+            List of detections for each of the images, in the same order as the images.
+        """
+
+        logger.debug(f"Running inference on {len(images)} images...")
+        start_time = time.perf_counter()
+
+        # prepare image tensors
+        image_tensor, letterboxes = self._preprocess(images)
 
         # run inference
-        output = self.model(image_tensor)
-        inf_out, train_out, attn, mask_iou, bases, sem_output = (
-            output["test"],
-            output["bbox_and_cls"],
-            output["attn"],
-            output["mask_iou"],
-            output["bases"],
-            output["sem"],
-        )
+        with torch.no_grad():
+            outputs = self._forward(image_tensor)
+
+        # numerically sensitive post-processing (mask merging, sigmoid, NMS) runs in single precision
+        inf_out, attn, bases, sem_output = (output.float() for output in outputs)
 
         # ...
 
         bases = torch.cat([bases, sem_output], dim=1)
-        nb, _, tensor_height, tensor_width = image_tensor.shape
-        names = self.model.names
-        pooler_scale = self.model.pooler_scale
+        pooler_scale = self.pooler_scale
 
-        def pooler(features: torch.Tensor, boxes: list):
+        def pooler(features: torch.Tensor, boxes: torch.Tensor):
             """
             A replacement for Detectron2's ROIPooler using torchvision's roi_align.
+            Boxes are given in (image index, x1, y1, x2, y2) format, for the whole batch at once.
             """
             return roi_align(
                 features,
@@ -143,98 +487,174 @@ class YOLOv7:
                 sampling_ratio=-1,
             )
 
-        # NMS
-
-        output, output_mask, output_mask_score, output_ac, output_ab = (
-            non_max_suppression_mask_conf(
-                inf_out,
-                attn,
-                bases,
-                pooler,
-                self.hyp,
-                conf_thres=0.25,
-                iou_thres=0.65,
-                merge=False,
-                mask_iou=None,
-            )
+        # NMS, for the whole batch at once
+
+        output, output_mask, _ = non_max_suppression_mask_conf_batched(
+            inf_out,
+            attn,
+            bases,
+            pooler,
+            self.hyp,
+            conf_thres=0.25,
+            iou_thres=0.65,
+            classes=classes,
+            mask_iou=None,
+        )
+
+        detections = [
+            self._postprocess(pred, pred_masks, lb)
+            for (pred, pred_masks, lb) in zip(output, output_mask, letterboxes)
+        ]
+
+        logger.debug(
+            f"Ran inference and post-processing on {len(images)} images in {(time.perf_counter() - start_time) * 1000:.0f} ms, "
+            f"{sum(len(d) for d in detections)} detections."
         )
 
-        pred, pred_masks = output[0], output_mask[0]
+        return detections
+
+    def _preprocess(
+        self, images: list[np.ndarray]
+    ) -> tuple[torch.Tensor, list[LetterboxTransform]]:
+        """
+        Letterboxes the images into the model's input tensor.
+        Equivalent to `letterbox()` and `ToTensor()` (plus BGR -> RGB) for each image, but each image is resized
+        into a reusable buffer and then written to the input tensor in a single pass per channel,
+        converting to float and normalizing on the way. The input tensor itself is reused between calls.
+
+        Args:
+            images: OpenCV images (BGR).
+
+        Returns:
+            The (B, 3, H, W) input tensor on the model's device, and the letterbox of each image.
+        """
+        # the letterbox of a camera stream does not change from frame to frame, it is cached per image shape
+        # with a fixed input shape, every image is padded to exactly that shape
+        letterboxes = [
+            LetterboxTransform.for_shape(
+                image.shape[:2],
+                self.input_shape or 640,
+                stride=self.STRIDE,
+                auto=self.input_shape is None,
+            )
+            for image in images
+        ]
+
+        # images of different aspect ratios get different letterbox shapes, pad them (bottom/right) to a common one
+        # this keeps the letterbox offsets of each image intact
+        tensor_height = max(lb.shape[0] for lb in letterboxes)
+        tensor_width = max(lb.shape[1] for lb in letterboxes)
+        tensor_shape = (len(images), 3, tensor_height, tensor_width)
+
+        # the input tensor only needs clearing when the layout changes, the images always fill the same regions
+        if self._input_letterboxes != letterboxes:
+            if (
+                self._input_tensor is None
+                or tuple(self._input_tensor.shape) != tensor_shape
+            ):
+                self._input_tensor = torch.empty(
+                    tensor_shape,
+                    dtype=self.dtype,
+                    pin_memory=(self.device.type == "cuda"),
+                )
+            self._input_tensor.zero_()
+            self._input_letterboxes = letterboxes
+
+        for i, (image, lb) in enumerate(zip(images, letterboxes)):
+            resized_height, resized_width = lb.resized_shape
+            buffer = self._resize_buffers.get(i)
+            if buffer is None or buffer.shape[:2] != lb.resized_shape:
+                buffer = np.empty((resized_height, resized_width, 3), dtype=np.uint8)
+                self._resize_buffers[i] = buffer
+            image = lb.resize(image, dst=buffer)
+
+            # HWC BGR uint8 -> CHW RGB float (of the model's precision) in [0, 1] (the model is trained on RGB images)
+            image = torch.from_numpy(image)
+            top, left = lb.offset
+            region = self._input_tensor[
+                i, :, top : top + resized_height, left : left + resized_width
+            ]
+            for channel in range(3):
+                torch.mul(image[..., 2 - channel], 1 / 255, out=region[channel])
+
+        image_tensor = self._input_tensor.to(self.device, non_blocking=True)
+
+        return image_tensor, letterboxes
+
+    def _postprocess(
+        self,
+        pred: torch.Tensor | None,
+        pred_masks: torch.Tensor | None,
+        letterbox: LetterboxTransform,
+    ) -> list[Detection]:
+        """
+        Converts the NMS output for a single image into detections.
+
+        Args:
+            pred: Predictions of the image after NMS, (N, 6) tensor of (x1, y1, x2, y2, conf, cls).
+            pred_masks: Mask predictions of the image after NMS, (N, mask_resolution ** 2) tensor.
+            letterbox: Letterbox of the original image into the model's input.
+
+        Returns:
+            Detections in the original image.
+        """
 
         # if nothing is detected, return an empty list
         if (pred is None) or (pred_masks is None):
-            logger.debug(
-                f"Ran inference in {(time.perf_counter() - start_time) * 1000:.0f} ms, no detections."
-            )
             return []
 
-        # boxes (rescaled to negate letterboxing effect)
-        bboxes = pred[:, :4]
-        bboxes[:, 0] = bboxes[:, 0] - letterbox_w_padding
-        bboxes[:, 2] = bboxes[:, 2] - letterbox_w_padding
-        bboxes[:, 1] = bboxes[:, 1] - letterbox_h_padding
-        bboxes[:, 3] = bboxes[:, 3] - letterbox_h_padding
+        names = self.names
+
+        # boxes in the resized image (negating the letterbox padding)
+        bboxes = letterbox.letterbox_to_resized(pred[:, :4])
 
         # classes and confidences
         pred_cls = pred[:, 5].detach().cpu().numpy()
         pred_conf = pred[:, 4].detach().cpu().numpy()
 
+        # boxes in the original image, as (x, y, w, h)
+        boxes_np = letterbox.resized_to_image(bboxes.detach().cpu().numpy().copy())
+        boxes_np[:, 2:] -= boxes_np[:, :2]
+
         # masks
         original_pred_masks = pred_masks.view(
             -1, self.hyp["mask_resolution"], self.hyp["mask_resolution"]
         )
-        pred_masks = self._paste_masks_in_image(
+        pred_masks, crop_boxes = self._paste_masks_in_image(
             original_pred_masks,
             bboxes,
-            (
-                int(tensor_height - letterbox_h_padding * 2),
-                int(tensor_width - letterbox_w_padding * 2),
-            ),
+            letterbox.resized_shape,
             threshold=0.5,
         )
         pred_masks_np = pred_masks.detach().cpu().numpy()
+        crop_boxes_np = crop_boxes.cpu().numpy()
 
-        logger.debug(
-            f"Ran inference and post-processing in {(time.perf_counter() - start_time) * 1000:.0f} ms."
-        )
-
-        detections = [
+        # masks stay cropped to their boxes, full-frame masks are only built on demand
+        return [
             Detection(
-                mask=self._resize_mask(mask_np, original_height, original_width),
                 class_name=names[int(cls)] if (0 <= cls < len(names)) else "unknown",
                 confidence=conf,
+                box=tuple(float(v) for v in box),
+                mask_crop=mask_np[: y_2 - y_1, : x_2 - x_1],
+                mask_crop_box=(int(x_1), int(y_1), int(x_2), int(y_2)),
+                letterbox=letterbox,
+            )
+            for mask_np, (x_1, y_1, x_2, y_2), box, cls, conf in zip(
+                pred_masks_np, crop_boxes_np, boxes_np, pred_cls, pred_conf
             )
-            for (mask_np, cls, conf) in zip(pred_masks_np, pred_cls, pred_conf)
         ]
 
-        return detections
-
-    @staticmethod
-    def _resize_mask(mask: np.ndarray, height: int, width: int) -> np.ndarray[bool]:
-        """
-        Resize the boolean mask to the original image resolution.
-
-        Args:
-            mask: The mask to upscale. Should be of dtype bool.
-            height: The height of the original image.
-            width: The width of the original image.
-
-        Returns:
-            The resized boolean mask.
-        """
-        return cv2.resize(
-            mask.astype(np.uint8), (width, height), interpolation=cv2.INTER_NEAREST
-        ).astype(bool)
-
     @staticmethod
     def _paste_masks_in_image(
         masks: torch.Tensor,
         boxes: torch.Tensor,
         img_shape: tuple,
         threshold: float = 0.5,
-    ):
+    ) -> tuple[torch.Tensor, torch.Tensor]:
         """
         Paste segmented masks onto an image.
+        All masks are pasted at once with a single `grid_sample` call on the masks' device (similar to Detectron2's
+        `paste_masks_in_image`), but only the pixels covered by each box are computed and allocated.
 
         Args:
             masks: a tensor of shape (N, H_mask, W_mask), N masks of size H_mask x W_mask.
@@ -243,23 +663,60 @@ class YOLOv7:
             threshold: a float in [0, 1]. Areas with a mask value > threshold will be pasted.
 
         Returns:
-            torch.Tensor: a bool tensor of shape (N, img_shape[0], img_shape[1]).
+            A bool tensor of shape (N, h, w) with each mask pasted into the crop of the image covered by its box,
+            aligned to the top left corner (h, w are the size of the largest crop, the rest is False),
+            and an int tensor of shape (N, 4) with the crops in (x1, y1, x2, y2) image pixel coordinates.
         """
 
         N = masks.shape[0]
         img_h, img_w = img_shape
-        output = torch.zeros(N, img_h, img_w, dtype=torch.bool)
-
-        boxes = boxes.cpu().numpy().astype(np.int32)
+        device = masks.device
+        boxes = boxes.to(device).float()
+
+        # pixels covered by each box, clipped to the image
+        crop_boxes = torch.stack(
+            [
+                boxes[:, 0].floor().clamp(0, img_w),
+                boxes[:, 1].floor().clamp(0, img_h),
+                boxes[:, 2].ceil().clamp(0, img_w),
+                boxes[:, 3].ceil().clamp(0, img_h),
+            ],
+            dim=1,
+        ).long()
+        crop_widths = (crop_boxes[:, 2] - crop_boxes[:, 0]).clamp(min=0)
+        crop_heights = (crop_boxes[:, 3] - crop_boxes[:, 1]).clamp(min=0)
+        crop_w = int(crop_widths.max()) if N else 0
+        crop_h = int(crop_heights.max()) if N else 0
+        if (crop_w <= 0) or (crop_h <= 0):
+            return torch.zeros(
+                N, crop_h, crop_w, dtype=torch.bool, device=device
+            ), crop_boxes
+
+        # sampling grid, pixel centers of each crop in normalized [-1, 1] coordinates of its box
+        box_x_1, box_y_1, box_x_2, box_y_2 = torch.split(boxes, 1, dim=1)  # each (N, 1)
+        img_x = crop_boxes[:, 0:1] + torch.arange(crop_w, device=device) + 0.5  # (N, w)
+        img_y = crop_boxes[:, 1:2] + torch.arange(crop_h, device=device) + 0.5  # (N, h)
+        img_x = (img_x - box_x_1) / (box_x_2 - box_x_1).clamp(min=1) * 2 - 1
+        img_y = (img_y - box_y_1) / (box_y_2 - box_y_1).clamp(min=1) * 2 - 1
+        grid = torch.stack(
+            [
+                img_x[:, None, :].expand(N, crop_h, crop_w),
+                img_y[:, :, None].expand(N, crop_h, crop_w),
+            ],
+            dim=3,
+        )
 
-        for i in range(N):
-            box = boxes[i]
-            x_1, y_1, x_2, y_2 = box.tolist()
-            mask = masks[i]
-            mask_resized = torch.nn.functional.interpolate(
-                mask[None, None], size=(y_2 - y_1, x_2 - x_1), mode="bilinear"
-            )[0][0]
-            mask_resized = mask_resized > threshold
-            output[i, y_1:y_2, x_1:x_2] = mask_resized
+        pasted = torch.nn.functional.grid_sample(
+            masks[:, None].float(), grid, mode="bilinear", align_corners=False
+        )[:, 0]
+        pasted = pasted > threshold
+
+        # crops smaller than the largest one are padded with False
+        pasted &= (
+            torch.arange(crop_h, device=device)[None, :] < crop_heights[:, None]
+        )[:, :, None]
+        pasted &= (torch.arange(crop_w, device=device)[None, :] < crop_widths[:, None])[
+            :, None, :
+        ]
 
-        return output
+        return pasted, crop_boxes
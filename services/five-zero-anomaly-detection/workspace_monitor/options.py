@@ -0,0 +1,54 @@
+"""
+Options of the components of the pipeline, shared by their implementations and the configuration.
+Only depends on the standard library, so that the configuration can be loaded without the components'
+(heavy) dependencies, e.g. PyTorch.
+"""
+
+from typing import Literal
+
+InferenceBackend = Literal["eager", "torchscript", "compile"]
+"""
+Backends running the model's forward pass:
+- "eager": the PyTorch model as is
+- "torchscript": the model traced with TorchScript for the fixed input shape and frozen, cached next to the weights file
+- "compile": the model compiled with `torch.compile` for the fixed input shape, on startup
+  (the generated kernels are cached by PyTorch itself, see `TORCHINDUCTOR_CACHE_DIR`)
+"""
+
+Precision = Literal["fp32", "fp16", "bf16"]
+"""
+Floating point precisions of the model's weights and inputs:
+- "fp32": single precision
+- "fp16": half precision, for GPUs (CUDA, MPS)
+- "bf16": bfloat16, for CPUs with native support (e.g. Xeons with AVX-512 BF16 or AMX)
+Both half precisions halve the memory of the model. Post-processing always runs in single precision.
+"""
+
+DetectorBackend = Literal[InferenceBackend, "onnxruntime", "onnxruntime-int8"]
+"""
+Backends of the object detector: the backends of `YOLOv7` (see `InferenceBackend`),
+or "onnxruntime" for `OnnxYOLOv7`, running the model exported to `yolov7-mask.onnx` (see `export_onnx`),
+or "onnxruntime-int8" for `OnnxYOLOv7` running the model quantized to `yolov7-mask.int8.onnx` (see `quantize_onnx`).
+"""
+
+FrameFormat = Literal["i420", "rgb24"]
+"""
+Formats of the frames requested from LiveKit:
+- "i420": frames as decoded, converted to BGR once, only when taken from the stream
+- "rgb24": frames converted to RGB by LiveKit (every frame), then to BGR when taken from the stream
+"""
+
+PayloadFormat = Literal["json", "binary"]
+"""
+Wire formats of the published workspace states:
+- "json": a single JSON document, the frame is embedded as a base64 string
+- "binary": compact JSON metadata followed by the raw JPEG bytes, see `encode_binary_payload`
+"""
+
+JpegBackend = Literal["opencv", "pillow", "turbojpeg"]
+"""
+Available JPEG encoder backends:
+- "opencv": `cv2.imencode`, encodes BGR frames directly
+- "pillow": Pillow (or Pillow-SIMD, if installed in its place), needs an RGB copy of the frame
+- "turbojpeg": libjpeg-turbo through the optional `PyTurboJPEG` package, encodes BGR frames directly
+"""
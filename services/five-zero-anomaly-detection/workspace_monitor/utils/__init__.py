@@ -1,5 +1,14 @@
+from .drop_oldest_queue import DropOldestQueue
+from .jpeg_encoder import JpegBackend, JpegEncoder
 from .stopwatch import Stopwatch
+from .threads import configure_threads, current_thread_cpus, pin_current_thread
 
 __all__ = [
+    "DropOldestQueue",
+    "JpegBackend",
+    "JpegEncoder",
     "Stopwatch",
+    "configure_threads",
+    "current_thread_cpus",
+    "pin_current_thread",
 ]
@@ -0,0 +1,46 @@
+import queue
+from typing import Any
+
+
+class DropOldestQueue(queue.Queue):
+    """
+    A bounded FIFO queue that never blocks the producer.
+    When the queue is full, the oldest item is discarded to make room for the new one,
+    so the consumer always receives the freshest items available.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        if maxsize <= 0:
+            raise ValueError(
+                "DropOldestQueue must be bounded, maxsize must be positive"
+            )
+
+        super().__init__(maxsize=maxsize)
+
+        self.dropped = 0
+        """Number of items discarded so far because the queue was full."""
+
+    def put(self, item: Any, block: bool = True, timeout: float | None = None) -> None:
+        """
+        Puts an item into the queue, discarding the oldest item if the queue is full.
+        Never blocks, `block` and `timeout` are accepted only for compatibility with `queue.Queue`.
+        """
+        with self.not_full:
+            while self._qsize() >= self.maxsize:
+                self._get()
+                self.unfinished_tasks -= 1
+                self.dropped += 1
+
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def put_without_dropping(self, item: Any) -> None:
+        """
+        Puts an item into the queue without discarding any, even if that exceeds the queue's size,
+        e.g. a sentinel telling the consumer to stop once it has received the remaining items.
+        """
+        with self.not_full:
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
@@ -0,0 +1,93 @@
+import io
+
+import cv2
+from numpy.typing import NDArray
+
+from workspace_monitor.options import JpegBackend
+
+try:
+    import turbojpeg  # optional, for the libjpeg-turbo backend
+except ImportError:
+    turbojpeg = None
+
+
+class JpegEncoder:
+    def __init__(
+        self,
+        backend: JpegBackend = "opencv",
+        quality: int = 75,
+        scale: float = 1.0,
+    ):
+        """
+        Encodes OpenCV (BGR) frames as JPEG images.
+
+        Args:
+            backend: JPEG encoder implementation to use.
+            quality: JPEG quality, 1 (worst) to 100 (best).
+            scale: Factor to downscale the frames by before encoding, 1 keeps the original resolution.
+        """
+        if not (1 <= quality <= 100):
+            raise ValueError(f"JPEG quality must be between 1 and 100, got {quality}")
+        if not (0 < scale <= 1):
+            raise ValueError(f"Frame scale must be in (0, 1], got {scale}")
+
+        self.backend = backend
+        self.quality = quality
+        self.scale = scale
+
+        if backend == "opencv":
+            self._encode = self._encode_opencv
+        elif backend == "pillow":
+            self._encode = self._encode_pillow
+        elif backend == "turbojpeg":
+            if turbojpeg is None:
+                raise RuntimeError(
+                    "JPEG backend 'turbojpeg' requires the PyTurboJPEG package and the libjpeg-turbo library"
+                )
+            self._turbojpeg = turbojpeg.TurboJPEG()
+            self._encode = self._encode_turbojpeg
+        else:
+            raise ValueError(f"Unknown JPEG backend '{backend}'")
+
+    def __str__(self):
+        return (
+            f"JPEG encoder ({self.backend}, quality {self.quality}, scale {self.scale})"
+        )
+
+    def encode(self, frame: NDArray) -> bytes:
+        """
+        Encodes the frame as a JPEG image.
+
+        Args:
+            frame: OpenCV image in BGR format.
+
+        Returns:
+            The JPEG image data.
+        """
+        if self.scale != 1:
+            frame = cv2.resize(
+                frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA
+            )
+
+        return self._encode(frame)
+
+    def _encode_opencv(self, frame: NDArray) -> bytes:
+        ok, data = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise RuntimeError("OpenCV failed to encode the frame as JPEG")
+
+        return data.tobytes()
+
+    def _encode_pillow(self, frame: NDArray) -> bytes:
+        from PIL import Image
+
+        with io.BytesIO() as output:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            img = Image.fromarray(frame)
+            img.save(output, format="JPEG", quality=self.quality)
+            return output.getvalue()
+
+    def _encode_turbojpeg(self, frame: NDArray) -> bytes:
+        return self._turbojpeg.encode(
+            frame, quality=self.quality, pixel_format=turbojpeg.TJPF_BGR
+        )
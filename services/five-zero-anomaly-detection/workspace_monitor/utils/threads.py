@@ -0,0 +1,68 @@
+import logging
+import os
+
+import cv2
+import torch
+
+log = logging.getLogger(__name__)
+
+
+def configure_threads(
+    torch_threads: int | None = None,
+    torch_interop_threads: int | None = None,
+    opencv_threads: int | None = None,
+) -> None:
+    """
+    Sets the sizes of the thread pools of PyTorch and OpenCV, shared by the whole process.
+    Must be called before PyTorch runs anything in parallel, i.e. before the model is loaded.
+
+    Args:
+        torch_threads: Number of threads PyTorch runs each operation with (intra-op), its default if not given.
+        torch_interop_threads: Number of threads PyTorch runs independent operations with (inter-op),
+            its default if not given.
+        opencv_threads: Number of threads OpenCV runs each function with, 0 to run on the calling thread only.
+            Left as is if not given.
+    """
+    if torch_threads is not None:
+        torch.set_num_threads(torch_threads)
+    if torch_interop_threads is not None:
+        torch.set_num_interop_threads(torch_interop_threads)
+    if opencv_threads is not None:
+        cv2.setNumThreads(opencv_threads)
+
+    log.info(
+        f"Threads: PyTorch {torch.get_num_threads()} (inter-op {torch.get_num_interop_threads()}), "
+        f"OpenCV {cv2.getNumThreads()}"
+    )
+
+
+def current_thread_cpus() -> list[int]:
+    """
+    Returns the CPUs the calling thread may run on, empty if CPU affinity is not supported on this platform.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return []
+
+    return sorted(os.sched_getaffinity(0))
+
+
+def pin_current_thread(cpus: list[int]) -> None:
+    """
+    Restricts the calling thread to the given CPUs (Linux only).
+    Threads started by the calling thread afterward, including the thread pools of PyTorch, OpenCV and LiveKit,
+    inherit the restriction.
+
+    Args:
+        cpus: Indices of the CPUs to run on, no restriction is applied if empty.
+    """
+    if not cpus:
+        return
+
+    if not hasattr(os, "sched_setaffinity"):
+        log.warning(
+            "CPU affinity is not supported on this platform, threads are not pinned"
+        )
+        return
+
+    # on Linux, pid 0 refers to the calling thread only, not to the whole process
+    os.sched_setaffinity(0, cpus)
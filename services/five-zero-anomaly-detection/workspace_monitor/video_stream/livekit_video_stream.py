@@ -2,6 +2,9 @@ import asyncio
 import logging
 import threading
 import time
+from collections.abc import Collection
+from dataclasses import dataclass
+from datetime import datetime
 from threading import Thread
 
 import cv2
@@ -9,10 +12,30 @@ import numpy as np
 from livekit import api, rtc
 from numpy.typing import NDArray
 
+from workspace_monitor.options import FrameFormat
 from workspace_monitor.video_stream.base import VideoStream
 
 log = logging.getLogger(__name__)
 
+_LIVEKIT_BUFFER_TYPES = {
+    "i420": rtc.VideoBufferType.I420,
+    "rgb24": rtc.VideoBufferType.RGB24,
+}
+
+
+@dataclass
+class StreamFrame:
+    """
+    Frame taken from a LiveKit video stream.
+    """
+
+    seq: int
+    """Sequence number of the frame in the stream, starting at 1"""
+    timestamp: datetime
+    """Time the frame was received from LiveKit"""
+    image: NDArray
+    """The frame as an OpenCV image (BGR)"""
+
 
 class LiveKitVideoStream(VideoStream):
     """
@@ -31,23 +54,46 @@ class LiveKitVideoStream(VideoStream):
         api_key: str,
         api_secret: str,
         timeout: int = 5,
+        frame_format: FrameFormat = "i420",
+        max_height: int | None = None,
     ):
+        """
+        Args:
+            url: URL of the LiveKit server.
+            identity: Identity of this client in the room.
+            room_name: Name of the room to join.
+            track_name: Name of the video track to subscribe to.
+            api_key: API key for the LiveKit server.
+            api_secret: API secret for the LiveKit server.
+            timeout: Maximum time to wait for the track, in seconds.
+            frame_format: Format of the frames requested from LiveKit, see `FrameFormat`.
+            max_height: If set, frames taller than this are downscaled to it (keeping the aspect ratio)
+                as they are converted, so that no consumer handles full-resolution frames.
+        """
         self.url = str(url)
         self.identity = identity
         self.room_name = room_name
         self.track_name = track_name
         self.timeout = timeout
+        self.frame_format = frame_format
+        self.max_height = max_height
 
         self._api_key = api_key
         self._api_secret = api_secret
 
         self._video_stream = None
-        self._latest_frame: NDArray | None = self._WAITING_FOR_FRAME_FLAG
+        # the latest frame is kept as received from LiveKit and converted only when it is taken,
+        # most frames are superseded before the consumer gets to them
+        self._latest_frame: rtc.VideoFrame | None = self._WAITING_FOR_FRAME_FLAG
+        self._latest_frame_time: datetime | None = None
+        self._frame_count = 0
+        """Number of frames received so far, i.e. the sequence number of the latest frame"""
 
         # LiveKit SDK is async and needs an asyncio loop of its own to run
         # therefore, we are running it in a separate thread
         self._handler_thread: Thread | None = None
-        self._frame_lock = threading.Lock()
+        # notified on every new frame, and when the stream ends
+        self._frame_condition = threading.Condition()
 
     def start(self) -> None:
         self._handler_thread = Thread(
@@ -88,44 +134,149 @@ class LiveKitVideoStream(VideoStream):
                 token=token,
                 track_name=self.track_name,
                 timeout=self.timeout,
+                format=_LIVEKIT_BUFFER_TYPES[self.frame_format],
             )
 
             log.info(f"Located required stream: {stream}")
 
             async for event in stream:
-                frame = event.frame
-                image = frame_to_cv2(frame)
-
-                with self._frame_lock:
-                    self._latest_frame = image
+                with self._frame_condition:
+                    self._latest_frame = event.frame
+                    self._latest_frame_time = datetime.now()
+                    self._frame_count += 1
+                    self._frame_condition.notify_all()
         finally:
-            self._latest_frame = None
+            with self._frame_condition:
+                self._latest_frame = None
+                self._frame_condition.notify_all()
 
     def get_latest_frame(self) -> NDArray | None:
-        while self._latest_frame is self._WAITING_FOR_FRAME_FLAG:
-            # wait until we have a frame
-            log.debug("Waiting for frame...")
-            time.sleep(0.5)
+        frame = self.wait_for_new_frame()
+        if frame is None:
+            return None
+
+        return frame.image
+
+    def wait_for_new_frame(
+        self, after_seq: int = 0, timeout: float | None = None
+    ) -> StreamFrame | None:
+        """
+        Waits for a frame newer than the given one and returns it.
+        Returns right away if such a frame has already been received.
+
+        Args:
+            after_seq: Sequence number of the last frame the caller has seen, 0 to take any frame.
+            timeout: Maximum time to wait for a new frame in seconds, None to wait indefinitely.
+
+        Returns:
+            The latest frame, or None if the stream has ended.
+
+        Raises:
+            TimeoutError: If no new frame is received within the timeout.
+        """
+        with self._frame_condition:
+            received = self._frame_condition.wait_for(
+                lambda: self._latest_frame is None or self._frame_count > after_seq,
+                timeout=timeout,
+            )
+            if not received:
+                raise TimeoutError(
+                    f"Timed out after {timeout} seconds waiting for a new frame from track '{self.track_name}'"
+                )
+
+            frame = self._latest_frame
+            seq = self._frame_count
+            timestamp = self._latest_frame_time
+
+        if frame is None:
+            return None
+
+        # the LiveKit frame is never modified once received, so it can be converted outside the lock
+        # the conversion creates a new image, owned by the caller - no need to copy it
+        image = frame_to_cv2(frame, max_height=self.max_height)
+        return StreamFrame(seq=seq, timestamp=timestamp, image=image)
+
+
+def wait_for_new_frames(
+    streams: list[LiveKitVideoStream],
+    after_seqs: list[int],
+    timeout: float,
+    stalled: Collection[int] = (),
+) -> list[StreamFrame | None] | None:
+    """
+    Waits for a frame newer than the given one from each of the streams, for at most `timeout` seconds overall,
+    so that a stalled stream does not hold back the others.
 
-        with self._frame_lock:
-            if self._latest_frame is None:
-                return None
+    Args:
+        streams: Streams to take the frames from.
+        after_seqs: Sequence number of the last frame the caller has seen from each stream, see `wait_for_new_frame`.
+        timeout: Maximum time to wait for the frames of all the streams, in seconds.
+        stalled: Indices of the streams known to be stalled, which are only checked for a new frame, not waited for.
+            If all the streams are stalled, they are waited for like the others, so that the caller does not spin.
 
-            return self._latest_frame.copy()
+    Returns:
+        The latest frame of each stream, None for the streams without a new frame within the timeout.
+        None if any of the streams has ended.
+    """
+    deadline = time.monotonic() + timeout
+    if all(i in stalled for i in range(len(streams))):
+        stalled = ()
 
+    frames = []
+    for i, (stream, after_seq) in enumerate(zip(streams, after_seqs)):
+        stream_timeout = 0 if i in stalled else max(deadline - time.monotonic(), 0)
+        try:
+            frame = stream.wait_for_new_frame(
+                after_seq=after_seq, timeout=stream_timeout
+            )
+        except TimeoutError:
+            frames.append(None)
+            continue
+
+        if frame is None:
+            return None
+        frames.append(frame)
 
-def frame_to_cv2(frame: rtc.VideoFrame) -> NDArray:
+    return frames
+
+
+def frame_to_cv2(frame: rtc.VideoFrame, max_height: int | None = None) -> NDArray:
     """
     Converts LiveKit's video frame to an OpenCV image.
+    I420 frames (of even dimensions) are converted by OpenCV in a single pass,
+    other formats are converted to RGB24 by LiveKit first.
+
+    Args:
+        frame: The LiveKit video frame.
+        max_height: If set and the frame is taller, the frame is downscaled to this height (keeping the aspect ratio).
+            The frame is resized before the colour conversion, so that only the conversion to BGR runs
+            at the reduced resolution.
     """
 
     w, h = frame.width, frame.height
 
+    size = None
+    if max_height is not None and h > max_height:
+        # even dimensions, for I420 chroma planes of exactly half the size
+        size = (round(w * max_height / h / 2) * 2, max_height // 2 * 2)
+
+    if frame.type == rtc.VideoBufferType.I420 and w % 2 == 0 and h % 2 == 0:
+        # Y plane followed by the U and V planes at half resolution, as expected by OpenCV
+        buffer = np.frombuffer(frame.data, dtype=np.uint8)
+        if size is not None:
+            buffer = resize_i420(buffer, (w, h), size)
+            (w, h) = size
+        buffer = buffer.reshape((h * 3 // 2, w))
+
+        return cv2.cvtColor(buffer, cv2.COLOR_YUV2BGR_I420)
+
     if frame.type != rtc.VideoBufferType.RGB24:
         frame = frame.convert(rtc.VideoBufferType.RGB24)
 
     buffer = np.frombuffer(frame.data, dtype=np.uint8)
     buffer = buffer.reshape((h, w, 3))
+    if size is not None:
+        buffer = cv2.resize(buffer, size, interpolation=cv2.INTER_LINEAR)
 
     # convert from RGB to BGR
     buffer = cv2.cvtColor(buffer, cv2.COLOR_RGB2BGR)
@@ -133,6 +284,43 @@ def frame_to_cv2(frame: rtc.VideoFrame) -> NDArray:
     return buffer
 
 
+def resize_i420(
+    buffer: NDArray, size: tuple[int, int], new_size: tuple[int, int]
+) -> NDArray:
+    """
+    Resizes an I420 image plane by plane.
+
+    Args:
+        buffer: Flat I420 image data of even dimensions: the Y plane, then the U and V planes at half resolution.
+        size: Resolution (width, height) of the image.
+        new_size: Resolution (width, height) to resize the image to, must be even too.
+
+    Returns:
+        The flat I420 data of the resized image.
+    """
+    (w, h), (new_w, new_h) = size, new_size
+
+    resized = np.empty(new_w * new_h * 3 // 2, dtype=np.uint8)
+    src_offset, dst_offset = 0, 0
+    for plane_w, plane_h, new_plane_w, new_plane_h in (
+        (w, h, new_w, new_h),
+        (w // 2, h // 2, new_w // 2, new_h // 2),
+        (w // 2, h // 2, new_w // 2, new_h // 2),
+    ):
+        plane = buffer[src_offset : src_offset + plane_w * plane_h]
+        new_plane = resized[dst_offset : dst_offset + new_plane_w * new_plane_h]
+        cv2.resize(
+            plane.reshape((plane_h, plane_w)),
+            (new_plane_w, new_plane_h),
+            dst=new_plane.reshape((new_plane_h, new_plane_w)),
+            interpolation=cv2.INTER_LINEAR,
+        )
+        src_offset += plane_w * plane_h
+        dst_offset += new_plane_w * new_plane_h
+
+    return resized
+
+
 def get_room_join_token(
     room: str,
     identity: str,
@@ -168,6 +356,7 @@ async def get_livekit_video_stream(
     token: str,
     track_name: str,
     timeout: float = 5,
+    format: rtc.VideoBufferType.ValueType = rtc.VideoBufferType.RGB24,
 ) -> rtc.VideoStream:
     """
     Connects to a LiveKit room and waits for the given video track to be published and then returns the stream from it.
@@ -178,6 +367,7 @@ async def get_livekit_video_stream(
         track_name: The name of the track to subscribe to.
         timeout: The maximum time to wait for the track to be published.
             If no track is published within this time, the function will raise a TimeoutError.
+        format: The format LiveKit converts the frames of the stream to.
 
     Returns:
         The video stream from the track.
@@ -200,7 +390,7 @@ async def get_livekit_video_stream(
 
         log.info(f"Subscribed to video track '{track.name}' (sid: {track.sid})")
         nonlocal stream
-        stream = rtc.VideoStream(track, format=rtc.VideoBufferType.RGB24)
+        stream = rtc.VideoStream(track, format=format)
 
     await room.connect(url, token=token)
     log.debug(f"Connected to LiveKit room '{room.name}'")
@@ -0,0 +1,78 @@
+# Publishing stage of the processing pipeline
+import logging
+from threading import Thread
+
+from ..utils import DropOldestQueue
+from .workspace_monitor import WorkspaceState
+from .workspace_state_publisher import WorkspaceStatePublisher
+
+log = logging.getLogger(__name__)
+
+
+class PublishingWorker:
+    def __init__(
+        self,
+        publisher: WorkspaceStatePublisher,
+        topic: str | None = None,
+        queue_size: int = 2,
+    ):
+        """
+        Publishes workspace states in a background thread, so that frame encoding and MQTT publishing
+        of one frame do not block the inference on the next one.
+        States are handed over through a bounded queue. If publishing falls behind, the oldest states are dropped.
+
+        Args:
+            publisher: Publisher used to send the workspace states. Must be connected already.
+                Several workers may share the same publisher.
+            topic: MQTT topic to publish to, defaults to the publisher's topic.
+            queue_size: Maximum number of states waiting to be published.
+        """
+        self.publisher = publisher
+        self.topic = topic
+        self._states = DropOldestQueue(maxsize=queue_size)
+        self._thread: Thread | None = None
+
+    @property
+    def dropped(self) -> int:
+        """Number of workspace states that were never published because the worker fell behind."""
+        return self._states.dropped
+
+    def start(self) -> None:
+        """
+        Starts publishing in a background thread.
+        """
+        self._thread = Thread(
+            target=self._publish_states,
+            name=f"PublishingWorker({self.topic or self.publisher.topic})",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def submit(self, state: WorkspaceState) -> None:
+        """
+        Queues a workspace state for publishing. Never blocks.
+        """
+        self._states.put(state)
+
+    def stop(self) -> None:
+        """
+        Stops the background thread after it has published the states remaining in the queue.
+        """
+        self._states.put_without_dropping(None)
+        if self._thread is not None:
+            self._thread.join()
+
+    def _publish_states(self) -> None:
+        while True:
+            state = self._states.get()
+            if state is None:
+                break
+
+            try:
+                self.publisher.publish_state(state, topic=self.topic)
+                log.info("Published update to MQTT broker")
+            except Exception as e:
+                # a failed update is superseded by the next one anyway - keep publishing
+                log.error(f"Error publishing workspace state: {e}")
+
+        log.debug(f"Publishing worker stopped, dropped {self.dropped} states")
@@ -0,0 +1,103 @@
+# Pacing of the processing pipeline, slowing the inference down while the workspace is idle
+import logging
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class InferenceRateController:
+    def __init__(
+        self,
+        idle_fps: float = 2.0,
+        active_fps: float | None = None,
+        hold_off: float = 10.0,
+        report_interval: float = 30.0,
+    ):
+        """
+        Paces the inference loop: at a low rate while there are no intrusions, at the full rate as soon as
+        one appears and for a hold-off period after the last one, so that the reaction is fast when it matters
+        and the CPU (and power) use is low in an idle cell.
+
+        Call `wait` before taking the next frames, and `update` with the results of their processing.
+
+        Args:
+            idle_fps: Inference rate while there are no intrusions, in frames per second.
+            active_fps: Inference rate with intrusions, None to run as fast as the pipeline allows.
+            hold_off: Time to keep the active rate after the last intrusion, in seconds.
+            report_interval: Interval at which the effective rate is logged, in seconds.
+        """
+        if idle_fps <= 0 or (active_fps is not None and active_fps < idle_fps):
+            raise ValueError(
+                f"Inference rates must be positive, the active one not below the idle one, got {idle_fps} and {active_fps}"
+            )
+
+        self.idle_fps = idle_fps
+        self.active_fps = active_fps
+        self.hold_off = hold_off
+        self.report_interval = report_interval
+
+        self._active_until = float("-inf")
+        self._last_start: float | None = None
+        # start times of the recent iterations, over the report interval
+        self._starts: deque[float] = deque()
+        self._last_report = time.monotonic()
+
+    @property
+    def active(self) -> bool:
+        """Whether the loop runs at the active rate, i.e. there was an intrusion within the hold-off period."""
+        return time.monotonic() < self._active_until
+
+    @property
+    def target_fps(self) -> float | None:
+        """Current target rate, None if unlimited."""
+        return self.active_fps if self.active else self.idle_fps
+
+    @property
+    def effective_fps(self) -> float:
+        """Rate of the iterations over the report interval, in frames per second."""
+        if len(self._starts) < 2:
+            return 0.0
+
+        return (len(self._starts) - 1) / (self._starts[-1] - self._starts[0])
+
+    def wait(self) -> None:
+        """
+        Waits until the next iteration is due at the current target rate.
+        """
+        target_fps = self.target_fps
+        if self._last_start is not None and target_fps is not None:
+            delay = self._last_start + 1 / target_fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        now = time.monotonic()
+        self._last_start = now
+        self._starts.append(now)
+        while self._starts[0] < now - self.report_interval:
+            self._starts.popleft()
+
+    def update(self, intrusions: bool) -> None:
+        """
+        Registers the results of the iteration, switching to the active rate if there are intrusions.
+
+        Args:
+            intrusions: Whether any of the processed frames has intrusions.
+        """
+        now = time.monotonic()
+        if intrusions:
+            if not self.active:
+                log.info("Intrusion detected, switching to the active inference rate")
+            self._active_until = now + self.hold_off
+
+        if now - self._last_report >= self.report_interval:
+            self._last_report = now
+            target = (
+                f"{self.target_fps:.1f} FPS"
+                if self.target_fps is not None
+                else "unlimited"
+            )
+            log.info(
+                f"Inference rate: {self.effective_fps:.1f} FPS "
+                f"({'active' if self.active else 'idle'}, target {target})"
+            )
@@ -0,0 +1,76 @@
+# Pre-filter stage of the processing pipeline, skipping the inference on frames of a static scene
+import time
+from collections.abc import Hashable
+
+import cv2
+import numpy as np
+from numpy.typing import NDArray
+
+
+class SceneChangeFilter:
+    def __init__(
+        self,
+        threshold: float = 0.01,
+        pixel_threshold: int = 25,
+        width: int = 64,
+        max_interval: float = 2.0,
+    ):
+        """
+        Decides whether a frame needs to go through the object detector, by comparing a downscaled grayscale copy
+        of it to the last frame that did. Frames of a static scene can reuse the detections of that frame.
+        The reference frame only changes on inference, so slow changes add up until they trigger one.
+
+        Args:
+            threshold: Fraction of the pixels that must change for the scene to be considered changed.
+            pixel_threshold: Minimum difference of a pixel's intensity (0-255) to count as changed,
+                above the noise of the camera.
+            width: Width the frames are downscaled to for the comparison, the aspect ratio is kept.
+            max_interval: Maximum time between two inferences on the frames of a camera in seconds,
+                even if the scene does not change.
+        """
+        if not (0 <= threshold < 1):
+            raise ValueError(
+                f"Scene change threshold must be in [0, 1), got {threshold}"
+            )
+
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.width = width
+        self.max_interval = max_interval
+
+        # per camera: the downscaled last frame that went through the detector, and when
+        self._references: dict[Hashable, NDArray] = {}
+        self._reference_times: dict[Hashable, float] = {}
+
+    def needs_inference(self, camera: Hashable, frame: NDArray) -> bool:
+        """
+        Whether the frame differs enough from the last inferred frame of the camera to need inference.
+        Registers the frame as the camera's new reference if so.
+
+        Args:
+            camera: Key of the camera the frame comes from, e.g. its index.
+            frame: OpenCV image (BGR).
+        """
+        now = time.monotonic()
+
+        (h, w) = frame.shape[:2]
+        small = cv2.resize(
+            frame,
+            (self.width, max(round(h * self.width / w), 1)),
+            interpolation=cv2.INTER_AREA,
+        )
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+        reference = self._references.get(camera)
+        changed = (
+            reference is None
+            or reference.shape != small.shape
+            or now - self._reference_times[camera] >= self.max_interval
+            or np.count_nonzero(cv2.absdiff(small, reference) > self.pixel_threshold)
+            > self.threshold * small.size
+        )
+        if changed:
+            self._references[camera] = small
+            self._reference_times[camera] = now
+
+        return changed
@@ -1,13 +1,17 @@
 # Script responsible for monitoring the robot workspace through a video stream
 import logging
+from collections.abc import Hashable
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 
 from numpy.typing import NDArray
 
-from ..object_detector.yolo_v7 import YOLOv7, Detection
+from ..object_detector.onnx_yolo_v7 import OnnxYOLOv7
+from ..object_detector.yolo_v7 import Detection, YOLOv7
+from ..options import DetectorBackend, Precision
 from ..utils import Stopwatch
+from .scene_change_filter import SceneChangeFilter
 
 log = logging.getLogger(__name__)
 
@@ -23,6 +27,11 @@ DEFAULT_TRACKED_CLASSES = ["person"]
 Default list of classes to track.
 """
 
+_ONNX_FILE_NAMES = {
+    "onnxruntime": "yolov7-mask.onnx",
+    "onnxruntime-int8": "yolov7-mask.int8.onnx",
+}
+
 
 @dataclass
 class WorkspaceState:
@@ -33,6 +42,8 @@ class WorkspaceState:
     timestamp: datetime
     frame: NDArray
     intrusions: list[Detection]
+    reused: bool = False
+    """Whether the scene did not change since the previous state, and its intrusions were reused without inference"""
 
 
 class WorkspaceMonitor:
@@ -40,6 +51,12 @@ class WorkspaceMonitor:
         self,
         tracked_objects: list[str],
         detector_resources_path: Path = DEFAULT_DETECTOR_RESOURCES_DIRECTORY,
+        input_shape: tuple[int, int] | None = None,
+        backend: DetectorBackend = "eager",
+        precision: Precision = "fp32",
+        num_threads: int | None = None,
+        scene_change_filter: SceneChangeFilter | None = None,
+        detector: YOLOv7 | None = None,
     ):
         """
         Analyzes frames from the workspace camera stream to detect intrusions.
@@ -50,6 +67,15 @@ class WorkspaceMonitor:
             detector_resources_path: Path to the directory containing the files required to run the object detector.
                 This may include the model weights, configuration files, and other resources.
                 Individual file paths are to be parsed by the object detector itself.
+            input_shape: Fixed (height, width) of the object detector's input, see `YOLOv7`.
+            backend: Backend running the object detector's model, see `DetectorBackend`.
+            precision: Precision of the object detector's model, see `Precision`. ONNX Runtime backends only run in fp32.
+            num_threads: Number of threads ONNX Runtime backends run the model with.
+                PyTorch's thread pool is shared by the whole process, see `configure_threads`.
+            scene_change_filter: If given, frames of a static scene (without intrusions) skip the object detector,
+                their states reuse the intrusions of the camera's previous state.
+            detector: Object detector to use instead of loading one from `detector_resources_path`,
+                in which case the options of the detector (input shape, backend, precision, threads) are ignored.
         """
 
         if not tracked_objects:
@@ -59,28 +85,111 @@ class WorkspaceMonitor:
         self.tracked_classes = tracked_objects
 
         # initialize the object detector
-        self.detector = YOLOv7(
-            weights_file_path=detector_resources_path / "yolov7-mask.pt",
-            hyperparameters_file_path=detector_resources_path / "hyp.scratch.mask.yaml",
-        )
+        if detector is not None:
+            self.detector = detector
+        elif backend in _ONNX_FILE_NAMES:
+            if precision != "fp32":
+                raise ValueError(
+                    f"Backend '{backend}' does not support precision '{precision}'"
+                )
+            # the input shape is the one the model was exported with
+            self.detector = OnnxYOLOv7(
+                onnx_file_path=detector_resources_path / _ONNX_FILE_NAMES[backend],
+                hyperparameters_file_path=detector_resources_path
+                / "hyp.scratch.mask.yaml",
+                num_threads=num_threads,
+            )
+            if (
+                input_shape is not None
+                and tuple(input_shape) != self.detector.input_shape
+            ):
+                raise ValueError(
+                    f"Input shape {input_shape} does not match the exported model's {self.detector.input_shape}"
+                )
+        else:
+            self.detector = YOLOv7(
+                weights_file_path=detector_resources_path / "yolov7-mask.pt",
+                hyperparameters_file_path=detector_resources_path
+                / "hyp.scratch.mask.yaml",
+                input_shape=input_shape,
+                backend=backend,
+                precision=precision,
+            )
+
+        # the detector only builds masks for the tracked classes
+        self._tracked_class_indices = self.detector.class_indices(self.tracked_classes)
+
+        self.scene_change_filter = scene_change_filter
+        # per camera, the last state, to reuse on frames that skip the detector
+        self._last_states: dict[Hashable, WorkspaceState] = {}
 
     def process(self, frame: NDArray) -> WorkspaceState:
         """Process a frame and return the workspace state."""
+        return self.process_batch([frame])[0]
 
-        with Stopwatch() as sw:
-            # detect objects in the frame
-            detections = self.detector.detect(frame)
-            log.debug(f"Detected {len(detections)} objects in {sw}")
+    def process_batch(
+        self,
+        frames: list[NDArray],
+        timestamps: list[datetime] | None = None,
+        cameras: list[Hashable] | None = None,
+    ) -> list[WorkspaceState]:
+        """
+        Process frames from several cameras at once and return the workspace state seen by each of them.
+        All frames go through the object detector in a single batch, except for the frames skipped by the
+        scene change filter.
+
+        Args:
+            frames: Frames to process, one per camera.
+            timestamps: Capture times of the frames, the time of processing if not given.
+            cameras: Keys of the cameras the frames come from, e.g. their track names, needed when not all cameras
+                are part of every batch. The positions of the frames in the batch if not given.
+        """
 
-        # only keep the detections of the tracked classes
-        detections = [
-            detection
-            for detection in detections
-            if detection.class_name in self.tracked_classes
+        if timestamps is None:
+            timestamps = [datetime.now()] * len(frames)
+        if cameras is None:
+            cameras = list(range(len(frames)))
+
+        # frames that go through the detector (by position in the batch)
+        # with intrusions in the scene, every frame does, to keep track of them
+        inferred = [
+            i
+            for i, (camera, frame) in enumerate(zip(cameras, frames))
+            if self.scene_change_filter is None
+            or camera not in self._last_states
+            or self._last_states[camera].intrusions
+            or self.scene_change_filter.needs_inference(camera, frame)
         ]
 
-        return WorkspaceState(
-            timestamp=datetime.now(),
-            frame=frame,
-            intrusions=detections,
-        )
+        batch_detections = []
+        if inferred:
+            with Stopwatch() as sw:
+                # detect objects of the tracked classes in the frames
+                batch_detections = self.detector.detect_batch(
+                    [frames[i] for i in inferred], classes=self._tracked_class_indices
+                )
+                log.debug(
+                    f"Detected {sum(len(d) for d in batch_detections)} objects in {len(inferred)} frames in {sw}"
+                )
+
+        states = []
+        detections_by_frame = dict(zip(inferred, batch_detections))
+        for i, (camera, frame, timestamp) in enumerate(
+            zip(cameras, frames, timestamps)
+        ):
+            if i in detections_by_frame:
+                state = WorkspaceState(
+                    timestamp=timestamp, frame=frame, intrusions=detections_by_frame[i]
+                )
+            else:
+                # static scene, the state is a heartbeat of the previous one
+                state = WorkspaceState(
+                    timestamp=timestamp,
+                    frame=frame,
+                    intrusions=self._last_states[camera].intrusions,
+                    reused=True,
+                )
+            self._last_states[camera] = state
+            states.append(state)
+
+        return states
@@ -1,26 +1,31 @@
 import base64
 import datetime
-import io
 import json
 import logging
+import struct
+import threading
 import time
+from typing import Any
 
-import cv2
-from PIL import Image
 from numpy.typing import NDArray
 from paho.mqtt.client import Client as MqttClient
 from pydantic import BaseModel
 
 from workspace_monitor.object_detector.utils import (
     BoundingBox,
-    mask_to_bounding_box,
     normalize_bounding_box,
 )
+from workspace_monitor.options import PayloadFormat
+from workspace_monitor.utils import JpegEncoder
 
 from .workspace_monitor import WorkspaceState
 
 log = logging.getLogger(__name__)
 
+BINARY_PAYLOAD_MAGIC = b"WSM\x01"
+"""Prefix identifying (version 1 of) the binary payload format"""
+_BINARY_HEADER = struct.Struct(">4sI")  # magic, metadata length
+
 
 class BoxDetection(BaseModel):
     """
@@ -42,23 +47,40 @@ class WorkspaceStateMessage(BaseModel):
 
     timestamp: datetime.datetime
     """Timestamp of the frame"""
-    frame: dict
-    """Base64 encoded image frame"""
+    frame: dict | None
+    """Image frame: its MIME type, and the base64 encoded data in the JSON payload format.
+    None if frames are published to their own topic"""
     resolution: tuple[int, int]
     """Resolution of the image frame"""
     intrusions: list[BoxDetection]
     """List of detected objects in the frame"""
 
 
-def encode_frame_base64_jpeg(frame: NDArray) -> dict:
+class FrameMessage(BaseModel):
+    """
+    Image frame published to its own topic, alongside the (frameless) workspace state messages.
+    """
+
+    timestamp: datetime.datetime
+    """Timestamp of the frame, matches the timestamp of the workspace state"""
+    frame: dict
+    """Image frame: its MIME type, and the base64 encoded data in the JSON payload format"""
+    resolution: tuple[int, int]
+    """Resolution of the image frame"""
+
+
+def encode_frame_base64_jpeg(
+    frame: NDArray, encoder: JpegEncoder | None = None
+) -> dict:
     """
     Encodes the image frame as a base64 string (JPEG).
+
+    Args:
+        frame: OpenCV image in BGR format.
+        encoder: JPEG encoder to use, OpenCV with default settings if not given.
     """
-    with io.BytesIO() as output:
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(frame)
-        img.save(output, format="JPEG")
-        data = output.getvalue()
+    encoder = encoder or JpegEncoder()
+    data = encoder.encode(frame)
 
     base64_str = base64.b64encode(data).decode("utf-8")
 
@@ -68,6 +90,45 @@ def encode_frame_base64_jpeg(frame: NDArray) -> dict:
     }
 
 
+def encode_binary_payload(data: dict, frame: bytes) -> bytes:
+    """
+    Encodes a message in the binary payload format:
+    the magic prefix, the length of the metadata (4 bytes, big endian), the metadata as UTF-8 JSON,
+    and then the raw image data until the end of the payload.
+
+    Args:
+        data: JSON-serializable metadata of the message.
+        frame: Encoded image frame, e.g. JPEG data.
+    """
+    metadata = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return b"".join(
+        (_BINARY_HEADER.pack(BINARY_PAYLOAD_MAGIC, len(metadata)), metadata, frame)
+    )
+
+
+def decode_payload(payload: bytes) -> tuple[dict[str, Any], bytes | None]:
+    """
+    Decodes a workspace state payload, in either payload format, for consumers of the MQTT topic.
+
+    Args:
+        payload: Payload of the MQTT message.
+
+    Returns:
+        The message (the content of its "value" field) and the encoded image frame, if the message has one.
+    """
+    if payload.startswith(BINARY_PAYLOAD_MAGIC):
+        (_, metadata_length) = _BINARY_HEADER.unpack_from(payload)
+        metadata_end = _BINARY_HEADER.size + metadata_length
+        data = json.loads(payload[_BINARY_HEADER.size : metadata_end])
+        frame = payload[metadata_end:] or None
+    else:
+        data = json.loads(payload)
+        frame_data = (data["value"].get("frame") or {}).get("data")
+        frame = base64.b64decode(frame_data) if frame_data else None
+
+    return data["value"], frame
+
+
 class WorkspaceStatePublisher:
     def __init__(
         self,
@@ -76,6 +137,9 @@ class WorkspaceStatePublisher:
         topic: str = "workspace/state",
         username: str | None = None,
         password: str | None = None,
+        encoder: JpegEncoder | None = None,
+        payload_format: PayloadFormat = "json",
+        frame_interval: float | None = None,
     ):
         """
         Publishes the state of the workspace to an MQTT broker.
@@ -86,6 +150,13 @@ class WorkspaceStatePublisher:
             topic: MQTT topic to publish the workspace state to.
             username: Username for the MQTT broker.
             password: Password for the MQTT broker.
+            encoder: JPEG encoder for the frames, OpenCV with default settings if not given.
+            payload_format: Wire format of the published messages, see `PayloadFormat`.
+                Use `decode_payload` to read either format.
+            frame_interval: If set, workspace states are published without the frame, and the frames are published
+                separately to `<topic>/frame`: at most once per `frame_interval` seconds, plus whenever the
+                intrusions change or a frame is requested on `<topic>/frame/request`.
+                If not set, every workspace state is published with its frame.
         """
         self.broker_address = broker_address
         self.broker_port = broker_port
@@ -96,6 +167,17 @@ class WorkspaceStatePublisher:
             self.client.tls_set()
 
         self.topic = topic
+        self.encoder = encoder or JpegEncoder()
+        self.payload_format = payload_format
+        self.frame_interval = frame_interval
+
+        # per state topic (i.e. per camera): when the last frame was published, and for which intrusions
+        self._last_frame_times: dict[str, float] = {}
+        self._last_frame_intrusions: dict[str, list[str]] = {}
+        self._frame_requests: set[str] = set()
+        self._frame_lock = threading.Lock()
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
 
     def connect(self, timeout: float = 5) -> None:
         """
@@ -126,18 +208,23 @@ class WorkspaceStatePublisher:
 
         log.info("MQTT client connected")
 
-    def publish_state(self, state: WorkspaceState) -> None:
+    def publish_state(self, state: WorkspaceState, topic: str | None = None) -> None:
         """
         Publish the state of the workspace to the MQTT broker.
+
+        Args:
+            state: State of the workspace to publish.
+            topic: MQTT topic to publish to, if different from the publisher's default topic (e.g. a per-camera topic).
         """
+        topic = topic or self.topic
 
         (h, w) = state.frame.shape[:2]
 
         # convert intrusion detections to bounding boxes
         intrusions = []
         for i in state.intrusions:
-            # mask to normalized bounding box
-            box = mask_to_bounding_box(i.mask)
+            # tight box of the mask (computed on the small mask crop), or the detector's box if the mask is empty
+            box = i.mask_box or i.box
             box_normalized = normalize_bounding_box(box, (w, h))
 
             # convert to a serializable model
@@ -148,24 +235,104 @@ class WorkspaceStatePublisher:
             )
             intrusions.append(intrusion)
 
+        if self.frame_interval is None:
+            frame, jpeg = self._encode_frame(state.frame)
+        else:
+            # the frame goes to its own topic
+            frame, jpeg = None, None
+
         # craft a serializable workspace state
         state_message = WorkspaceStateMessage(
             timestamp=state.timestamp,
-            frame=encode_frame_base64_jpeg(state.frame),
+            frame=frame,
             resolution=(w, h),
             intrusions=intrusions,
         )
+        self._publish(topic, state_message, jpeg)
+
+        log.debug(
+            f"Published workspace state to MQTT broker '{self.broker_address}:{self.broker_port}' with topic '{topic}'"
+        )
 
-        # publish
-        data = state_message.model_dump(mode="json")
+        if self.frame_interval is not None and self._frame_due(topic, state):
+            frame, jpeg = self._encode_frame(state.frame)
+            frame_message = FrameMessage(
+                timestamp=state.timestamp,
+                frame=frame,
+                resolution=(w, h),
+            )
+            self._publish(f"{topic}/frame", frame_message, jpeg)
+
+            log.debug(f"Published frame with topic '{topic}/frame'")
+
+    def _frame_due(self, topic: str, state: WorkspaceState) -> bool:
+        """
+        Whether the frame of the workspace state should be published to the frame topic.
+        Registers the frame as published if so.
+        """
+        now = time.monotonic()
+        intrusions = sorted(i.class_name for i in state.intrusions)
+
+        with self._frame_lock:
+            last_time = self._last_frame_times.get(topic)
+            due = (
+                last_time is None
+                or now - last_time >= self.frame_interval
+                or intrusions != self._last_frame_intrusions.get(topic)
+                or topic in self._frame_requests
+            )
+            if due:
+                self._last_frame_times[topic] = now
+                self._last_frame_intrusions[topic] = intrusions
+                self._frame_requests.discard(topic)
+
+        return due
+
+    def _on_connect(
+        self, client, userdata, flags, reason_code, properties=None
+    ) -> None:
+        # subscribe on every (re)connection, the subscriptions of a clean session do not survive a reconnection
+        if self.frame_interval is not None:
+            # frame requests for our topic and the per-camera topics below it
+            client.subscribe(
+                [
+                    (f"{self.topic}/frame/request", 1),
+                    (f"{self.topic}/+/frame/request", 1),
+                ]
+            )
+
+    def _on_message(self, client, userdata, message) -> None:
+        # a frame request on `<state topic>/frame/request`
+        suffix = "/frame/request"
+        if message.topic.endswith(suffix):
+            with self._frame_lock:
+                self._frame_requests.add(message.topic.removesuffix(suffix))
+
+    def _encode_frame(self, frame: NDArray) -> tuple[dict, bytes | None]:
+        """
+        Encodes the frame for a message in the publisher's payload format.
+
+        Returns:
+            The frame field of the message, and the raw JPEG data to append to a binary payload.
+        """
+        if self.payload_format == "binary":
+            # the frame is appended to the payload as is, saving the base64 encoding (and its +33% size)
+            return {"mime": "image/jpeg"}, self.encoder.encode(frame)
+
+        return encode_frame_base64_jpeg(frame, self.encoder), None
+
+    def _publish(
+        self, topic: str, message: BaseModel, jpeg: bytes | None = None
+    ) -> None:
+        data = message.model_dump(mode="json")
         data = {"value": data}
+        if self.payload_format == "binary":
+            payload = encode_binary_payload(data, jpeg or b"")
+        else:
+            payload = json.dumps(data)
         self.client.publish(
-            self.topic,
-            payload=json.dumps(data),
+            topic,
+            payload=payload,
             qos=1,
             retain=False,
         )
-
-        log.debug(
-            f"Published workspace state to MQTT broker '{self.broker_address}:{self.broker_port}' with topic '{self.topic}'"
-        )